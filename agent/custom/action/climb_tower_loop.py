@@ -3,6 +3,8 @@ from maa.custom_action import CustomAction
 from maa.context import Context
 
 from custom.action import climb_tower_potential
+from custom.action import climb_tower_shop
+from utils import profiler
 from utils import logger as logger_module
 logger = logger_module.get_logger("climb_tower_loop")
 
@@ -23,8 +25,12 @@ class AscensionLoop(CustomAction):
         Returns:
             bool: 返回 True。
         """
-        # 重置潜能状态
+        # 重置潜能状态和协奏音符核实结果
         climb_tower_potential.State.reset()
+        climb_tower_shop.MelodyState.reset()
+
+        # 输出本次爬塔的性能分析数据（未开启时不输出）
+        profiler.dump("完成一次爬塔")
 
         # 更新循环次数，并判断是否继续爬塔
         node_data = context.get_node_data(argv.node_name)
@@ -1,5 +1,10 @@
 import re
+import json
 import time
+import uuid
+import bisect
+from pathlib import Path
+from collections import OrderedDict
 from dataclasses import dataclass, field
 from typing import Optional, Any, Self
 
@@ -9,12 +14,31 @@ from maa.agent.agent_server import AgentServer
 from maa.custom_action import CustomAction
 from maa.context import Context
 
+from utils import coin_ledger
+from utils import replay_recorder
+from utils.ocr_rules import OcrRules
 from utils import logger as logger_module
+from utils.frame_watcher import wait_for_stable, wait_until
 logger = logger_module.get_logger("climb_tower_potential")
 
 
 MAX_POTENTIAL_LEVEL: int = 6  # 潜能等级上限，condition max_level 字段的默认值
 
+# 录制回放用例时使用的节点，整张截图的 OCR 使用名称节点
+RECORDED_OCR_NODE: str = "星塔_节点_选择潜能_识别潜能名称_agent"
+RECORDED_NODES: list[str] = [
+    "星塔_通用_识别当前金币_agent",
+    "星塔_通用_识别刷新花费_agent",
+    "星塔_节点_选择潜能_识别核心潜能_agent",
+    "星塔_节点_选择潜能_识别潜能数量_agent",
+    "星塔_节点_选择潜能_识别推荐图标_agent",
+    "星塔_节点_选择潜能_识别预选潜能位置_agent",
+    "星塔_节点_选择潜能_检测干扰文字_agent",
+    "星塔_节点_选择潜能_识别潜能名称_agent",
+    "星塔_节点_选择潜能_识别潜能等级_agent",
+    "星塔_节点_选择潜能_识别推荐等级_agent",
+]
+
 DEFAULT_POTENTIAL_LAYOUTS = {
     1: [
         {
@@ -77,6 +101,14 @@ class State:
     high_level_span_count: int = 0
     potential_count: int = 0
     owned_potentials: dict = {}
+    priority_rules: Optional["PriorityRules"] = None
+    # 爬塔状态日志，首行为本次爬塔的 run_id 与开始时间，之后每次选择潜能后追加一行，
+    # agent 重启后回放以恢复状态
+    journal_path: Path = Path(__file__).resolve().parents[3] / "cache" / "climb_tower_state.jsonl"
+    # 状态日志超过该时长（秒）没有写入时视为已中断的爬塔，不再回放
+    journal_max_idle: float = 30 * 60
+    journal_loaded: bool = False
+    run_id: Optional[str] = None
 
     @classmethod
     def reset(cls):
@@ -84,6 +116,171 @@ class State:
         cls.high_level_span_count = 0
         cls.potential_count = 0
         cls.owned_potentials.clear()
+        cls.priority_rules = None
+        cls.journal_loaded = True
+        cls.run_id = None
+        try:
+            cls.journal_path.unlink(missing_ok=True)
+        except OSError as e:
+            logger.warning(f"清空爬塔状态日志失败：{e}")
+
+    @classmethod
+    def begin_run(cls):
+        """开始新的一次爬塔，覆盖旧的状态日志并写入 run_id 与开始时间"""
+        cls.run_id = uuid.uuid4().hex
+        header = {"run_id": cls.run_id, "started": time.time()}
+        try:
+            cls.journal_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(cls.journal_path, "w", encoding="utf-8") as f:
+                f.write(json.dumps(header, separators=(",", ":")) + "\n")
+        except OSError as e:
+            logger.warning(f"写入爬塔状态日志失败：{e}")
+
+    @classmethod
+    def record_pick(cls, trekker: str | None, potential_name: str | None, new_level: int):
+        """在状态日志末尾追加一次选择记录。
+
+        每行为一个 JSON 数组：[trekker, 潜能名称, 新等级, potential_count, failed_count, high_level_span_count]，
+        不需要更新已拥有潜能时 trekker 与潜能名称为 null。
+        """
+        if cls.run_id is None:
+            cls.begin_run()
+        line = [trekker, potential_name, new_level, cls.potential_count, cls.failed_count, cls.high_level_span_count]
+        try:
+            with open(cls.journal_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(line, ensure_ascii=False, separators=(",", ":")) + "\n")
+        except OSError as e:
+            logger.warning(f"写入爬塔状态日志失败：{e}")
+
+    @classmethod
+    def load(cls):
+        """回放状态日志，恢复 agent 重启前的爬塔状态，只在首次调用时生效。
+
+        只回放仍在进行中的爬塔：日志首行必须是 run_id 与开始时间，且最近一次写入
+        不早于 journal_max_idle 秒之前，否则视为已中断的爬塔并清空日志。
+        """
+        if cls.journal_loaded:
+            return
+        cls.journal_loaded = True
+        try:
+            with open(cls.journal_path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+            idle = time.time() - cls.journal_path.stat().st_mtime
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            logger.warning(f"读取爬塔状态日志失败：{e}")
+            return
+
+        try:
+            header = json.loads(lines[0])
+            run_id = header["run_id"]
+            started = float(header["started"])
+        except (IndexError, ValueError, TypeError, KeyError):
+            run_id = started = None
+        if run_id is None or idle > cls.journal_max_idle:
+            logger.info("爬塔状态日志不属于进行中的爬塔，已忽略")
+            cls.reset()
+            return
+        cls.run_id = run_id
+
+        count = 0
+        for line in lines[1:]:
+            try:
+                trekker, potential_name, new_level, potential_count, failed_count, high_level_span_count = json.loads(line)
+            except (ValueError, TypeError):
+                # 进程中断时最后一行可能不完整
+                logger.debug(f"跳过无法解析的爬塔状态日志：{line!r}")
+                continue
+            if potential_name:
+                ChoosePotentialAction._update_owned_potentials(cls.owned_potentials, potential_name, new_level, trekker)
+            cls.potential_count = potential_count
+            cls.failed_count = failed_count
+            cls.high_level_span_count = high_level_span_count
+            count += 1
+
+        if count:
+            started_at = time.strftime("%H:%M:%S", time.localtime(started))
+            logger.info(f"已从 {started_at} 开始的爬塔状态日志恢复 {count} 次潜能选择记录")
+
+    @classmethod
+    def get_priority_rules(cls, potential_priority_raw: list[dict]) -> "PriorityRules":
+        """获取与 priority_list 对应的规则筛选器，内容不变时复用上一次的筛选结果"""
+        if cls.priority_rules is None or cls.priority_rules.raw_list != potential_priority_raw:
+            cls.priority_rules = PriorityRules(potential_priority_raw)
+        return cls.priority_rules
+
+class RefreshPlanner:
+    """基于期望收益的潜能刷新规划器，对应 chooser "expected_value"。
+
+    记录每条规则以及每组可生效规则在历次潜能界面中的命中情况（跨爬塔循环累计），
+    没有规则命中时，估算刷新后至少命中一条规则的概率 p，仅当 p × refresh_match_value ≥ 刷新费用时才刷新。
+    扣除 reserved_coin 后是否还买得起这次刷新由调用方通过 Data.refreshable 判断。
+
+    p 取这组可生效规则实际出现过的界面中至少命中一条的比例，以单条规则命中率的最大值
+    作为先验进行平滑：(命中界面数 + 2 × 先验) / (界面数 + 2)。单条规则的命中率为
+    (命中次数 + 2 × refresh_prior_rate) / (出现次数 + 2)。各条规则的命中并不独立，
+    不直接把单条规则的未命中率相乘，否则规则较多时 p 会趋近于 1。
+    """
+    # 规则键 -> [出现次数, 命中次数]
+    history: dict[tuple, list[int]] = {}
+    # 可生效规则组 -> [界面数, 至少命中一条的界面数]
+    screen_history: dict[frozenset, list[int]] = {}
+
+    @classmethod
+    def reset(cls):
+        """清空所有命中记录，爬塔循环之间不调用，仅供离线回放等需要独立统计的场景使用"""
+        cls.history.clear()
+        cls.screen_history.clear()
+
+    @staticmethod
+    def rule_key(entry: dict[str, Any]) -> tuple:
+        return entry["trekker"], tuple(entry["names"])
+
+    @classmethod
+    def _active_keys(cls, entries: list[dict[str, Any]], refresh_count: int) -> frozenset:
+        return frozenset(cls.rule_key(e) for e in entries if e["refresh"] <= refresh_count)
+
+    @classmethod
+    def record(cls, entries: list[dict[str, Any]], matched: list[dict[str, Any]], refresh_count: int):
+        """记录一次潜能界面中各条可生效规则的命中情况"""
+        matched_keys = {cls.rule_key(e) for e in matched}
+        active_keys = cls._active_keys(entries, refresh_count)
+        for key in active_keys:
+            stats = cls.history.setdefault(key, [0, 0])
+            stats[0] += 1
+            if key in matched_keys:
+                stats[1] += 1
+
+        screen_stats = cls.screen_history.setdefault(active_keys, [0, 0])
+        screen_stats[0] += 1
+        if active_keys & matched_keys:
+            screen_stats[1] += 1
+
+    @classmethod
+    def match_rate(cls, entries: list[dict[str, Any]], refresh_count: int, prior_rate: float) -> float:
+        """估算下一次刷新后至少有一条规则命中的概率"""
+        active_keys = cls._active_keys(entries, refresh_count)
+        if not active_keys:
+            return 0.0
+
+        rule_rates = []
+        for key in active_keys:
+            seen, hits = cls.history.get(key, (0, 0))
+            rule_rates.append((hits + 2 * prior_rate) / (seen + 2))
+        screens, hit_screens = cls.screen_history.get(active_keys, (0, 0))
+        return (hit_screens + 2 * max(rule_rates)) / (screens + 2)
+
+    @classmethod
+    def should_refresh(cls, data: "Data") -> bool:
+        params = data.params
+        rate = cls.match_rate(params.priority_list, data.refresh_count + 1, params.refresh_prior_rate)
+        expected_value = rate * params.refresh_match_value
+        logger.debug(
+            f"刷新命中率估计 {rate:.2f}，期望收益 {expected_value:.0f}，刷新费用 {data.refresh_cost}"
+        )
+        return expected_value >= data.refresh_cost
+
 
 @dataclass(slots=True)
 class PotentialLayout:
@@ -113,6 +310,58 @@ class PotentialLayouts:
     def get(self, key, default=None):
         return self.potential_layouts.get(key, default)
 
+_NAME_NOISE_PATTERN = re.compile(r'\W')
+_NAME_REMOVED_CHARS = str.maketrans("", "", "ー")
+
+
+def clean_potential_name(name: str) -> str:
+    """清洗潜能名称，去除非 Unicode 字母数字字符以及长音符"ー"。"""
+    return _NAME_NOISE_PATTERN.sub('', name).translate(_NAME_REMOVED_CHARS)
+
+
+class PotentialNameIndex:
+    """优先级规则的潜能名称索引。
+
+    OCR 可能产生前后漏字或噪声字符，因此两边都先用 clean_potential_name 清洗，
+    只要 OCR 名称是规则名称的子串即视为匹配，覆盖前后漏字的情况。
+    中间漏字或错字无法处理，属于 OCR 识别质量问题。
+
+    构建时把每个规则名称的所有子串写入字典，查询时只需一次哈希查找，
+    耗时与 OCR 名称长度相关，与预设规模无关。
+    """
+
+    def __init__(self, priority_list: list[dict[str, Any]]):
+        self._index: dict[str, list[tuple[int, int]]] = {}
+        for rank, entry in enumerate(priority_list):
+            indexed = set()
+            for sub_rank, name in enumerate(entry["names"]):
+                cleaned = clean_potential_name(name)
+                for start in range(len(cleaned)):
+                    for end in range(start + 1, len(cleaned) + 1):
+                        key = cleaned[start:end]
+                        # 同一条规则只保留名称列表中最靠前的命中
+                        if key in indexed:
+                            continue
+                        indexed.add(key)
+                        self._index.setdefault(key, []).append((rank, sub_rank))
+
+    def lookup(self, name: str) -> list[tuple[int, int]]:
+        """查询与 OCR 名称匹配的规则。
+
+        Args:
+            name: OCR 识别到的潜能名称
+
+        Returns:
+            list[tuple[int, int]]: (rank, sub_rank) 列表，按 rank 升序排列；
+                rank 为规则在 priority_list 中的下标，sub_rank 为命中名称在该规则 names 中的下标
+        """
+        cleaned = clean_potential_name(name)
+        # 防止空字符串匹配任意规则
+        if not cleaned:
+            return []
+        return self._index.get(cleaned, [])
+
+
 @dataclass(slots=True)
 class Parameters:
     trigger_type: str
@@ -126,114 +375,201 @@ class Parameters:
     # 自带默认值的参数
     potential_layouts: PotentialLayouts = field(default_factory=lambda: PotentialLayouts())
     selected_potential_offset: int = 35
+    # 卡片文字读取方式，"separate"表示逐个 ROI 识别，"batch"表示对所有卡片做一次 OCR 后按 x_border 拆分
+    read_mode: str = "separate"
+    # chooser 为 "expected_value" 时使用：一次规则命中折合的金币价值，以及无历史数据时的先验命中率
+    refresh_match_value: int = 200
+    refresh_prior_rate: float = 0.1
+    # 根据 priority_list 编译的名称索引
+    name_index: PotentialNameIndex = field(init=False)
 
     def __post_init__(self):
-        parsed_list = self._parse_priority_raw_list(
-            self.priority_list,
-            State.owned_potentials,
-        )
+        rules = State.get_priority_rules(self.priority_list)
+        parsed_list = rules.update(State.owned_potentials)
         object.__setattr__(self, 'priority_list', parsed_list)
+        object.__setattr__(self, 'name_index', rules.name_index)
 
-    @staticmethod
-    def _parse_priority_raw_list(
-        potential_priority_raw: list[dict],
-        owned_potentials: dict,
-    ) -> list[dict[str, Any]]:
-        """对原始 priority_list 进行初筛，过滤掉 condition 当前不满足的规则。
 
-        排名使用原始 JSON 的 1-based 行号（index + 1），数值越小排名越高。
-        condition 不满足的条目直接跳过，其行号仍保留在原始位置，不影响其他条目的排名。
+class PriorityRules:
+    """对原始 priority_list 进行初筛，过滤掉 condition 当前不满足的规则。
 
-        Args:
-            potential_priority_raw: 原始优先级列表，每个元素结构：
-                {
-                    "trekker": str,         # 可选，潜能归属角色名
-                    "potential": str|list,  # 必填，潜能名称或名称列表
-                    "level_span": int,      # 可选，默认 1，最小升级跨度
-                    "max_level": int,       # 可选，默认 MAX_POTENTIAL_LEVEL，旧等级上限（不含）
-                    "refresh": int,         # 可选，默认 0，已刷新次数必须 >= 该值规则才生效
-                    "condition": list       # 可选，生效条件，元素为 dict 时 AND，为 list 时 OR
-                }
-            owned_potentials: 已拥有潜能状态，按 trekker 分组，结构：
-                {"花原": {"飞花乱坠": 1}, "unknown": {"盛大尾奏": 1}}
+    排名使用原始 JSON 的 1-based 行号（index + 1），数值越小排名越高。
+    condition 不满足的条目直接跳过，其行号仍保留在原始位置，不影响其他条目的排名。
+
+    构建时记录每条规则的 condition 依赖了哪些潜能名称（等级条件）和哪些 trekker（数量条件），
+    之后每次 update 只重新判定受已拥有潜能变化影响的规则，并在原列表上增删条目。
+
+    原始规则结构：
+        {
+            "trekker": str,         # 可选，潜能归属角色名
+            "potential": str|list,  # 必填，潜能名称或名称列表
+            "level_span": int,      # 可选，默认 1，最小升级跨度
+            "max_level": int,       # 可选，默认 MAX_POTENTIAL_LEVEL，旧等级上限（不含）
+            "refresh": int,         # 可选，默认 0，已刷新次数必须 >= 该值规则才生效
+            "condition": list       # 可选，生效条件，元素为 dict 时 AND，为 list 时 OR
+        }
+
+    筛选后的规则结构：
+        {
+            "trekker": str | None,  # 归属角色
+            "names": list[str],     # 目标潜能名称列表
+            "level_span": int,      # 最小升级跨度
+            "max_level": int,       # 旧等级上限（不含）
+            "refresh": int,         # 已刷新次数下限
+            "priority": int         # 原始 JSON 的 1-based 行号，越小排名越高
+        }
+    """
+
+    def __init__(self, potential_priority_raw: list[dict]):
+        self.raw_list = potential_priority_raw
+        # 通过初筛的规则，按 priority 升序排列
+        self.valid_entries: list[dict[str, Any]] = []
+        self.name_index = PotentialNameIndex(self.valid_entries)
+
+        self._entries: list[Optional[dict[str, Any]]] = []
+        self._valid: list[bool] = []
+        self._potential_deps: dict[str, set[int]] = {}
+        self._trekker_deps: dict[str, set[int]] = {}
+        # 上一次判定时的已拥有潜能快照，以及按名称展开的等级表
+        self._owned_snapshot: dict[str, dict[str, int]] = {}
+        self._owned_map: dict[str, int] = {}
+        self._evaluated = False
 
-        Returns:
-            list[dict]: 通过初筛的规则列表，每个元素结构：
-                {
-                    "trekker": str | None,  # 归属角色
-                    "names": list[str],     # 目标潜能名称列表
-                    "level_span": int,      # 最小升级跨度
-                    "max_level": int,       # 旧等级上限（不含）
-                    "refresh": int,         # 已刷新次数下限
-                    "priority": int         # 原始 JSON 的 1-based 行号，越小排名越高
-                }
-        """
-        owned_map: dict[str, int] = {}
-        for _p in owned_potentials.values():
-            owned_map.update(_p)
-
-        def _check_single_condition(item: dict) -> bool:
-            """检查单个 condition 子项是否满足。"""
-            if "count_at_least" in item or "count_at_most" in item:
-                potentials = owned_potentials.get(item["trekker"], {})
-                level_min = item.get("level_at_least")
-                level_max = item.get("level_at_most")
-                if level_min is not None or level_max is not None:
-                    potentials = {
-                        name: level for name, level in potentials.items()
-                        if (level_min is None or level >= level_min)
-                        and (level_max is None or level <= level_max)
-                    }
-                count = len(potentials)
-                if "count_at_least" in item and count < item["count_at_least"]:
-                    return False
-                if "count_at_most" in item and count > item["count_at_most"]:
-                    return False
-                return True
-            current = owned_map.get(item["potential"], 0)
-            min_ok = current >= item["level_at_least"] if "level_at_least" in item else True
-            max_ok = current <= item["level_at_most"] if "level_at_most" in item else True
-            return min_ok and max_ok
-
-        def _check_condition(cond: list) -> bool:
-            """检查 condition 列表是否满足。
-
-            元素全为 dict 时为 AND 逻辑；含 list 元素时为 OR 逻辑（内层为 AND）。
-            """
-            if not cond:
-                return True
-            if all(isinstance(item, dict) for item in cond):
-                return all(_check_single_condition(item) for item in cond)
-            for branch in cond:
-                if isinstance(branch, list):
-                    if all(_check_single_condition(item) for item in branch):
-                        return True
-                elif isinstance(branch, dict):
-                    if _check_single_condition(branch):
-                        return True
-            return False
-
-        valid_entries = []
         for index, raw in enumerate(potential_priority_raw):
             condition = raw.get("condition", [])
+            self._valid.append(False)
             if not isinstance(condition, list):
-                continue
-            if not _check_condition(condition):
+                self._entries.append(None)
                 continue
 
             potential = raw["potential"]
-            names = potential if isinstance(potential, list) else [potential]
-
-            valid_entries.append({
+            self._entries.append({
                 "trekker": raw.get("trekker"),
-                "names": names,
+                "names": potential if isinstance(potential, list) else [potential],
                 "level_span": raw.get("level_span", 1),
                 "max_level": raw.get("max_level", MAX_POTENTIAL_LEVEL),
                 "refresh": raw.get("refresh", 0),
                 "priority": index + 1,
             })
+            for item in self._iter_condition_items(condition):
+                if "count_at_least" in item or "count_at_most" in item:
+                    self._trekker_deps.setdefault(item["trekker"], set()).add(index)
+                else:
+                    self._potential_deps.setdefault(item["potential"], set()).add(index)
 
-        return valid_entries
+    @staticmethod
+    def _iter_condition_items(cond: list):
+        for branch in cond:
+            if isinstance(branch, list):
+                yield from (item for item in branch if isinstance(item, dict))
+            elif isinstance(branch, dict):
+                yield branch
+
+    def update(self, owned_potentials: dict) -> list[dict[str, Any]]:
+        """根据已拥有潜能的变化，增量更新通过初筛的规则列表。
+
+        Args:
+            owned_potentials: 已拥有潜能状态，按 trekker 分组，结构：
+                {"花原": {"飞花乱坠": 1}, "unknown": {"盛大尾奏": 1}}
+
+        Returns:
+            list[dict]: 通过初筛的规则列表（即 valid_entries 本身）
+        """
+        changed_names, changed_trekkers = self._diff_owned(owned_potentials)
+
+        if not self._evaluated:
+            affected = range(len(self._entries))
+            self._evaluated = True
+        else:
+            affected = set()
+            for name in changed_names:
+                affected |= self._potential_deps.get(name, set())
+            for trekker in changed_trekkers:
+                affected |= self._trekker_deps.get(trekker, set())
+
+        changed = False
+        for index in sorted(affected):
+            entry = self._entries[index]
+            valid = entry is not None and self._check_condition(
+                self.raw_list[index].get("condition", []), owned_potentials
+            )
+            if valid == self._valid[index]:
+                continue
+            self._valid[index] = valid
+            changed = True
+            position = bisect.bisect_left(self.valid_entries, entry["priority"], key=lambda e: e["priority"])
+            if valid:
+                self.valid_entries.insert(position, entry)
+            else:
+                del self.valid_entries[position]
+
+        if changed:
+            self.name_index = PotentialNameIndex(self.valid_entries)
+        return self.valid_entries
+
+    def _diff_owned(self, owned_potentials: dict) -> tuple[set[str], set[str]]:
+        """比较已拥有潜能与快照，返回变化的潜能名称和 trekker，并同步快照与等级表。"""
+        changed_names: set[str] = set()
+        changed_trekkers: set[str] = set()
+        for trekker in self._owned_snapshot.keys() | owned_potentials.keys():
+            old = self._owned_snapshot.get(trekker, {})
+            new = owned_potentials.get(trekker, {})
+            if old == new:
+                continue
+            changed_trekkers.add(trekker)
+            changed_names.update(name for name in old.keys() | new.keys() if old.get(name) != new.get(name))
+
+        if changed_trekkers:
+            self._owned_snapshot = {trekker: dict(p) for trekker, p in owned_potentials.items()}
+            # 同名潜能以最后一个 trekker 分组中的等级为准
+            for name in changed_names:
+                levels = [p[name] for p in owned_potentials.values() if name in p]
+                if levels:
+                    self._owned_map[name] = levels[-1]
+                else:
+                    self._owned_map.pop(name, None)
+        return changed_names, changed_trekkers
+
+    def _check_single_condition(self, item: dict, owned_potentials: dict) -> bool:
+        """检查单个 condition 子项是否满足。"""
+        if "count_at_least" in item or "count_at_most" in item:
+            potentials = owned_potentials.get(item["trekker"], {})
+            level_min = item.get("level_at_least")
+            level_max = item.get("level_at_most")
+            if level_min is not None or level_max is not None:
+                potentials = {
+                    name: level for name, level in potentials.items()
+                    if (level_min is None or level >= level_min)
+                    and (level_max is None or level <= level_max)
+                }
+            count = len(potentials)
+            if "count_at_least" in item and count < item["count_at_least"]:
+                return False
+            if "count_at_most" in item and count > item["count_at_most"]:
+                return False
+            return True
+        current = self._owned_map.get(item["potential"], 0)
+        min_ok = current >= item["level_at_least"] if "level_at_least" in item else True
+        max_ok = current <= item["level_at_most"] if "level_at_most" in item else True
+        return min_ok and max_ok
+
+    def _check_condition(self, cond: list, owned_potentials: dict) -> bool:
+        """检查 condition 列表是否满足。
+
+        元素全为 dict 时为 AND 逻辑；含 list 元素时为 OR 逻辑（内层为 AND）。
+        """
+        if not cond:
+            return True
+        if all(isinstance(item, dict) for item in cond):
+            return all(self._check_single_condition(item, owned_potentials) for item in cond)
+        for branch in cond:
+            if isinstance(branch, list):
+                if all(self._check_single_condition(item, owned_potentials) for item in branch):
+                    return True
+            elif isinstance(branch, dict):
+                if self._check_single_condition(branch, owned_potentials):
+                    return True
+        return False
 
 @dataclass(slots=True)
 class Potential:
@@ -305,9 +641,7 @@ class Potential:
         return old, new
 
     def _get_recommended_data(self, screen: "ScreenDataProcessor", data: "Data") -> tuple[bool, int]:
-        roi = self.potential_roi
-        adjusted_roi = [self._get_adjusted_roi(roi, data.params.selected_potential_offset)]
-        recommended = True if screen.check_potential_recommended(adjusted_roi) else False
+        recommended = screen.check_potential_recommended(self.x_border)
         if not recommended:
             return False, 0
         if recommended and data.core_potential:
@@ -375,19 +709,35 @@ class Data:
 
 
 class ScreenDataProcessor:
+    # 识别结果缓存的最大条目数
+    memo_size: int = 64
+
     def __init__(self, context: Context):
         self.context = context
         self.image = None
         self.max_try = 1
+        # 当前帧的识别结果缓存，键为 (mode, node_name, roi, frame_id)
+        self._memo: OrderedDict[tuple, Any] = OrderedDict()
+        self._frame_id = 0
+        # 各 OCR 节点 recognition.param 中的后处理规则，键为节点名称
+        self._ocr_rules: dict[str, OcrRules] = {}
 
     def screenshot(self):
+        self.clear_memo()
         self.image = self.context.tasker.controller.post_screencap().wait().get()
 
     def refresh(self):
+        self.clear_memo()
         self.context.run_task("星塔_节点_选择潜能_点击刷新_agent")
 
+    def clear_memo(self):
+        """清空识别结果缓存，并让当前帧失效"""
+        self._memo.clear()
+        self._frame_id += 1
+
     def click(self, box: list[int]) -> bool:
         """点击指定box"""
+        self.clear_memo()
         pipeline_override = {
             "星塔_节点_选择潜能_点击潜能_agent": {
                 "action": {
@@ -408,7 +758,7 @@ class ScreenDataProcessor:
         识别失败时返回默认值
 
         Args:
-            mode(str): 识别模式，"ocr"或"template"
+            mode(str): 识别模式，"ocr"、"ocr_box"或"template"，"ocr_box"返回未经节点筛选的全部结果
             node_name(str): 节点名称，用于识别结果的记录和返回
             failed_return(any): 识别失败时的默认值
             roi(tuple): 可选的ROI坐标，用于模板识别
@@ -420,28 +770,31 @@ class ScreenDataProcessor:
         """
         if image is None:
             if self.image is None:
+                self.clear_memo()
                 self.image = self.context.tasker.controller.post_screencap().wait().get()
             image = self.image
 
         actual_max_try = max_try if max_try > 0 else self.max_try
 
+        # 只缓存基于当前帧 self.image 的识别结果，外部传入的截图不参与缓存
+        memo_key = None
+        if image is self.image:
+            memo_key = (mode, node_name, self._freeze_roi(roi), self._frame_id)
+            if memo_key in self._memo:
+                self._memo.move_to_end(memo_key)
+                logger.debug(f"节点'{node_name}'命中识别缓存")
+                return self._memo[memo_key]
+
         pipeline_override = {node_name: {"recognition": {"param": {"roi": roi}}}} if roi else {}
 
         try_count = 0
         while True:
             reco_detail = self.context.run_recognition(node_name, image, pipeline_override)
-
-            if reco_detail and reco_detail.hit:
-                if mode == "ocr":
-                    # OCR 逻辑：返回文本
-                    logger.debug(f"节点{node_name} OCR结果：{[(r.text, r.score) for r in reco_detail.filtered_results]}")
-                    results = reco_detail.filtered_results
-                    return [r.text for r in results]
-                else:
-                    # Template 逻辑：返回坐标列表
-                    logger.debug(f"节点{node_name} 模板结果：{[(r.box, r.score) for r in reco_detail.filtered_results]}")
-                    results = sorted(reco_detail.filtered_results, key=lambda r: r.score, reverse=True)
-                    return [r.box for r in results]
+            result = self._parse_reco_detail(mode, node_name, reco_detail)
+            if result is not None:
+                if try_count == 0:
+                    self._remember(memo_key, result)
+                return result
 
             # 统一的日志记录
             status = "未识别到有效结果" if reco_detail and reco_detail.all_results else "未识别到任何内容"
@@ -454,19 +807,75 @@ class ScreenDataProcessor:
             if try_count >= actual_max_try:
                 break
 
-            logger.debug("等待1秒后重新识别")
-            time.sleep(1)
-            image = self.context.tasker.controller.post_screencap().wait().get()
+            logger.debug("等待画面变化后重新识别")
+            image = wait_for_stable(self.context.tasker.controller, reference=image, timeout=1.0)
 
         logger.debug(f"无法识别节点'{node_name}'，返回默认值 {failed_return}")
+        if try_count == 1:
+            self._remember(memo_key, failed_return)
         return failed_return
 
+    @staticmethod
+    def _parse_reco_detail(mode, node_name, reco_detail) -> Any:
+        """按识别模式提取识别结果，未命中时返回 None"""
+        if reco_detail and reco_detail.hit:
+            if mode == "ocr":
+                # OCR 逻辑：返回文本
+                logger.debug(f"节点{node_name} OCR结果：{[(r.text, r.score) for r in reco_detail.filtered_results]}")
+                results = reco_detail.filtered_results
+                return [r.text for r in results]
+            elif mode == "ocr_box":
+                # OCR 逻辑：返回全部结果的文本、坐标及分数，由调用方按各字段节点的规则筛选
+                logger.debug(f"节点{node_name} OCR结果：{[(r.text, r.box) for r in reco_detail.all_results]}")
+                return [(r.text, r.box, r.score) for r in reco_detail.all_results]
+            else:
+                # Template 逻辑：返回坐标列表
+                logger.debug(f"节点{node_name} 模板结果：{[(r.box, r.score) for r in reco_detail.filtered_results]}")
+                results = sorted(reco_detail.filtered_results, key=lambda r: r.score, reverse=True)
+                return [r.box for r in results]
+        return None
+
+    def _remember(self, memo_key: Optional[tuple], result: Any):
+        """写入识别结果缓存，超出容量时淘汰最久未使用的条目"""
+        if memo_key is None:
+            return
+        self._memo[memo_key] = result
+        self._memo.move_to_end(memo_key)
+        while len(self._memo) > self.memo_size:
+            self._memo.popitem(last=False)
+
+    @staticmethod
+    def _freeze_roi(roi) -> Optional[tuple]:
+        """把 ROI（可能是嵌套列表）转换为可哈希的元组"""
+        if not roi:
+            return None
+        return tuple(tuple(r) if isinstance(r, (list, tuple)) else r for r in roi)
+
     def _ocr(self, node_name, failed_return, **kwargs):
         return self._base_recognition("ocr", node_name, failed_return, **kwargs)
 
+    def _ocr_box(self, node_name, failed_return, **kwargs):
+        return self._base_recognition("ocr_box", node_name, failed_return, **kwargs)
+
     def _template(self, node_name, failed_return, **kwargs):
         return self._base_recognition("template", node_name, failed_return, **kwargs)
 
+    def filter_ocr_texts(self, node_name: str, results: list[tuple[str, float]]) -> list[str]:
+        """按节点 recognition.param 中的 replace、threshold 与 expected 处理 OCR 结果。
+
+        用于把其他节点识别到的文字当作 node_name 的识别结果，处理方式与该节点单独识别时一致。
+
+        Args:
+            node_name: 提供后处理规则的 OCR 节点名称
+            results: (text, score) 列表
+
+        Returns:
+            list[str]: 替换后分数达到 threshold 且匹配任一 expected 的文本
+        """
+        if node_name not in self._ocr_rules:
+            self._ocr_rules[node_name] = OcrRules.from_node(self.context, node_name)
+        return self._ocr_rules[node_name].filter(results)
+
     def get_current_coin(self, image: Optional[numpy.ndarray] = None, max_try: int = 1) -> int:
         texts = self._ocr("星塔_通用_识别当前金币_agent", ["0"], image=image, max_try=max_try)
         return int(texts[0])
@@ -528,9 +937,51 @@ class ScreenDataProcessor:
         texts = self._ocr(node_name, ["0"], roi=roi, image=image, max_try=max_try)
         return int(texts[0])
 
-    def check_item_list_visibility(self, max_try: int = 1) -> bool:
-        image = self.context.tasker.controller.post_screencap().wait().get()
-        return self._ocr("星塔_节点_选择潜能_检测干扰文字_agent", [], image=image, max_try=max_try)
+    def get_card_texts(
+            self,
+            rois: list[list[int]],
+            borders: list[list[int]],
+            image: Optional[numpy.ndarray] = None,
+            max_try: int = 1
+    ) -> list[list[tuple[str, list[int], float]]]:
+        """对所有卡片的文字区域做一次 OCR，再按 x_border 把结果拆分到各卡片。
+
+        OCR 范围为 rois 的外接矩形，结果按文字框中心点的 x 坐标落入哪张卡片的
+        x_border 区间（左闭右闭）来确定归属，落在所有区间外的结果会被丢弃。
+        返回的是未经筛选的结果，调用方需要用 filter_ocr_texts 按各字段节点的规则处理。
+
+        Args:
+            rois: 需要读取的文字区域列表，用于计算 OCR 范围
+            borders: 各卡片的 x 轴边界，每个元素为 [low, high]
+            image: 截图
+            max_try: 可选的最大重试次数，默认为1
+
+        Returns:
+            list: 与 borders 一一对应的列表，每个元素为该卡片内的 (text, box, score) 列表，按从上到下、从左到右排序
+        """
+        left = min(r[0] for r in rois)
+        top = min(r[1] for r in rois)
+        right = max(r[0] + r[2] for r in rois)
+        bottom = max(r[1] + r[3] for r in rois)
+        union_roi = [left, top, right - left, bottom - top]
+
+        node_name = "星塔_节点_选择潜能_识别潜能名称_agent"
+        results = self._ocr_box(node_name, [], roi=union_roi, image=image, max_try=max_try)
+
+        cards = [[] for _ in borders]
+        for text, box, score in sorted(results, key=lambda r: (r[1][1], r[1][0])):
+            center_x = box[0] + box[2] / 2
+            index = next((i for i, (low, high) in enumerate(borders) if low <= center_x <= high), -1)
+            if index < 0:
+                logger.debug(f"文字 '{text}' 不属于任何卡片，已忽略")
+                continue
+            cards[index].append((text, box, score))
+        return cards
+
+    def check_item_list_visibility(self, image: Optional[numpy.ndarray] = None, max_try: int = 1) -> bool:
+        if image is None:
+            image = self.context.tasker.controller.post_screencap().wait().get()
+        return bool(self._ocr("星塔_节点_选择潜能_检测干扰文字_agent", [], image=image, max_try=max_try))
 
     def get_potential_count(
             self,
@@ -580,12 +1031,7 @@ class ScreenDataProcessor:
         Returns:
             list: 包含推荐潜能序数的列表
         """
-        recommended_boxes = self._template(
-            "星塔_节点_选择潜能_识别推荐图标_agent",
-            [],
-            image=image,
-            max_try=max_try
-        )
+        recommended_boxes = self.get_recommended_hits(image=image, max_try=max_try)
         hit_xs = [r[0] for r in recommended_boxes]
         matched = [
             i for x in hit_xs
@@ -600,17 +1046,22 @@ class ScreenDataProcessor:
 
         return matched
 
+    def get_recommended_hits(self, image: Optional[numpy.ndarray] = None, max_try: int = 1) -> list:
+        """全屏识别推荐图标，返回按得分降序排列的命中框列表。
+
+        所有卡片共用这一次模板匹配，同一帧内重复调用直接读取识别缓存。
+        """
+        return self._template("星塔_节点_选择潜能_识别推荐图标_agent", [], image=image, max_try=max_try)
+
     def check_potential_recommended(
             self,
-            roi: list[list],
+            border: list[int],
             image: Optional[numpy.ndarray] = None,
             max_try: int = 1
     ) -> bool:
-        node_name = "星塔_节点_选择潜能_识别推荐图标_agent"
-        recommended_boxes = self._template(node_name, [], roi=roi, image=image, max_try=max_try)
-        if recommended_boxes:
-            return True
-        return False
+        """判断推荐图标是否落在指定卡片的 x_border 区间（左闭右闭）内"""
+        low, high = border
+        return any(low <= box[0] <= high for box in self.get_recommended_hits(image=image, max_try=max_try))
 
     def get_selected_potential_index(
             self,
@@ -650,17 +1101,25 @@ class ScreenDataProcessor:
 
 
 class ChoosePotentialHandler:
+    # 等待干扰文字消失的最长时间（秒）
+    item_list_timeout: float = 10.0
+
     def __init__(self, screen: ScreenDataProcessor, data: Data):
         self.screen = screen
         self.data = data
 
     def _wait_for_item_list_gone(self):
-        while True:
-            if self.screen.check_item_list_visibility():
-                logger.debug("识别到干扰文字，等待1秒")
-                time.sleep(1)
-                continue
-            break
+        # 干扰文字只占画面的一小部分，只比较识别区域的画面变化
+        node_data = self.screen.context.get_node_data("星塔_节点_选择潜能_检测干扰文字_agent") or {}
+        roi = node_data.get("recognition", {}).get("param", {}).get("roi")
+        gone, _ = wait_until(
+            self.screen.context.tasker.controller,
+            lambda image: self.screen.context.tasker.stopping or not self.screen.check_item_list_visibility(image),
+            timeout=self.item_list_timeout,
+            roi=roi,
+        )
+        if not gone:
+            logger.warning(f"等待干扰文字消失超过{self.item_list_timeout}秒，继续识别潜能")
 
     def initialize_potentials(self):
         # 初始化Potential对象，并储存到list中
@@ -720,7 +1179,7 @@ class ChoosePotentialHandler:
             old, new = self.screen.get_potential_level(roi)
             self.data.potentials[i].old_level, self.data.potentials[i].new_level = old, new
 
-    def _update_recommended_potentials(self):
+    def _update_recommended_potentials(self, read_level: bool = True):
         adjusted_rois = self._get_adjusted_rois(self.data.recommended_level_rois)
         indices = self.screen.get_recommended_potential(self.data.x_borders)
         for index in indices:
@@ -728,9 +1187,68 @@ class ChoosePotentialHandler:
             self.data.potentials[index].recommended = True
             if self.data.core_potential:
                 self.data.potentials[index].recommended_level = 1
-            else:
+            elif read_level:
                 self.data.potentials[index].recommended_level = self.screen.get_recommend_level(roi)
 
+    def _update_cards_batch(self):
+        """单次 OCR 读取所有卡片的名称、等级和推荐等级。
+
+        推荐等级仅写入已被标记为推荐的普通潜能，因此需要在 _update_recommended_potentials 之后调用。
+        各字段的文字按逐个识别时所用节点的规则处理，与 separate 模式保持一致。
+        """
+        name_rois = self.data.core_potential_name_rois if self.data.core_potential else self.data.general_potential_name_rois
+        card_rois = [
+            {"name": name_roi, "level": level_roi, "recommended_level": recommended_roi}
+            for name_roi, level_roi, recommended_roi in zip(
+                self._get_adjusted_rois(name_rois),
+                self._get_adjusted_rois(self.data.general_potential_level_rois),
+                self._get_adjusted_rois(self.data.recommended_level_rois),
+            )
+        ]
+        if self.data.core_potential:
+            for rois in card_rois:
+                del rois["level"]
+
+        all_rois = [roi for rois in card_rois for roi in rois.values()]
+        card_texts = self.screen.get_card_texts(all_rois, self.data.x_borders)
+
+        for potential, rois, texts in zip(self.data.potentials, card_rois, card_texts):
+            fields = self._split_card_texts(texts, rois)
+            potential.name = " ".join(
+                self.screen.filter_ocr_texts("星塔_节点_选择潜能_识别潜能名称_agent", fields["name"])
+            )
+            if not self.data.core_potential:
+                potential.old_level, potential.new_level = self.screen._parse_level_text(
+                    self.screen.filter_ocr_texts("星塔_节点_选择潜能_识别潜能等级_agent", fields["level"])
+                )
+                if potential.recommended:
+                    level_texts = self.screen.filter_ocr_texts(
+                        "星塔_节点_选择潜能_识别推荐等级_agent", fields["recommended_level"]
+                    )
+                    potential.recommended_level = int(level_texts[0]) if level_texts else 0
+
+    @staticmethod
+    def _split_card_texts(
+            texts: list[tuple[str, list[int], float]],
+            rois: dict[str, list[int]]
+    ) -> dict[str, list[tuple[str, float]]]:
+        """把单张卡片内的 OCR 结果按文字框中心点分配到各字段 ROI，返回各字段的 (text, score) 列表。
+
+        中心点同时落入多个 ROI 时（名称与等级区域上下有重叠），归属到中心距离最近的 ROI。
+        """
+        fields = {key: [] for key in rois}
+        for text, box, score in texts:
+            cx, cy = box[0] + box[2] / 2, box[1] + box[3] / 2
+            containing = [
+                key for key, r in rois.items()
+                if r[0] <= cx <= r[0] + r[2] and r[1] <= cy <= r[1] + r[3]
+            ]
+            if not containing:
+                continue
+            key = min(containing, key=lambda k: abs(rois[k][1] + rois[k][3] / 2 - cy))
+            fields[key].append((text, score))
+        return fields
+
     def _get_adjusted_rois(self, base_rois: list[list[int]]) -> list[list[int]]:
         """安全地获取偏移后的 ROI 副本，避免污染原始数据"""
         selected_index = self.data.selected_potential_index
@@ -760,6 +1278,8 @@ class ChoosePotentialHandler:
     def refresh(self):
         self.screen.refresh()
         self.data.refresh_count += 1
+        # 在商店购买潜能特饮时，刷新花费记入商店的金币账本
+        coin_ledger.spend(self.data.refresh_cost)
 
     @property
     def _default_potential(self):
@@ -788,9 +1308,13 @@ class GameRecommendedHandler(ChoosePotentialHandler):
         self.screen.screenshot()
         self.data.potentials = self.initialize_potentials()
 
-        self._update_recommended_potentials()
-        self._update_names()
-        self._update_levels()
+        if self.data.params.read_mode == "batch":
+            self._update_recommended_potentials(read_level=False)
+            self._update_cards_batch()
+        else:
+            self._update_recommended_potentials()
+            self._update_names()
+            self._update_levels()
 
         # 输出当前潜能列表到日志
         for potential in self.data.potentials:
@@ -917,8 +1441,11 @@ class AssistantPriorityHandler(ChoosePotentialHandler):
         self.screen.screenshot()
         self.data.potentials = self.initialize_potentials()
 
-        self._update_names()
-        self._update_levels()
+        if self.data.params.read_mode == "batch":
+            self._update_cards_batch()
+        else:
+            self._update_names()
+            self._update_levels()
 
         return self
 
@@ -956,8 +1483,8 @@ class AssistantPriorityHandler(ChoosePotentialHandler):
     ) -> tuple[int, int, str | None]:
         """获取单个待选潜能在规则列表中的最高排名及其 trekker 归属。
 
-        遍历 priority_list，找到所有名称匹配且满足 level_span / max_level / refresh
-        条件的规则，返回排名数值最小（即优先级最高）的规则对应的排名与 trekker。
+        通过名称索引取出所有名称匹配的规则（已按排名升序排列），返回第一条满足
+        level_span / max_level / refresh 条件的规则对应的排名与 trekker。
 
         Args:
             potential: 单个待选潜能，结构：
@@ -971,68 +1498,22 @@ class AssistantPriorityHandler(ChoosePotentialHandler):
         """
         priority_list = self.data.params.priority_list
 
-        best_entry = None
-        best_rank = -1
-        best_sub_rank = -1
-
-        for rank, entry in enumerate(priority_list):
-            # 1. 基础剪枝：优先级如果不更高，直接跳过
-            if best_entry and entry["priority"] >= best_entry["priority"]:
-                continue
-
-            # 2. 匹配名称并获取优先级排名
-            sub_rank = self._find_sub_rank(potential.name, entry["names"])
-            if sub_rank == -1:
-                continue
-
-            # 3. 验证其他规则是否通过
-            if not self._is_entry_valid(entry, potential):
-                continue
-
-            # 全部通过后，记录该行及副等级
-            best_entry = entry
-            best_rank = rank
-            best_sub_rank = sub_rank
-
-        if not best_entry:
-            best_entry = {"trekker": ""}
-
-        return best_rank, best_sub_rank, best_entry["trekker"]
-
-    def _find_sub_rank(self, name: str, rule_names: list[str]) -> int:
-        """通过潜能名称获取最优排名数值"""
-        return next((i for i, r in enumerate(rule_names)
-                     if self._match_potential_name(name, r)), -1)
-
-    @staticmethod
-    def _match_potential_name(ocr_name: str, rule_name: str) -> bool:
-        """比较 OCR 识别的潜能名称与规则中的潜能名称是否匹配。
+        for rank, sub_rank in self.data.params.name_index.lookup(potential.name):
+            entry = priority_list[rank]
+            if self._is_entry_valid(entry, potential):
+                return rank, sub_rank, entry["trekker"]
 
-        OCR 可能产生前后漏字或噪声字符，因此先清洗两边字符串（去除非 Unicode
-        字母数字字符），再用 in 检查，覆盖前后漏字的情况。
+        return -1, -1, ""
 
-        中间漏字或错字无法处理，属于 OCR 识别质量问题。
-
-        Args:
-            ocr_name: OCR 识别到的潜能名称
-            rule_name: 优先级规则中定义的潜能名称
-
-        Returns:
-            bool: 两者匹配时返回 True
-        """
-        cleaned_ocr = re.sub(r'\W', '', ocr_name)
-        cleaned_rule = re.sub(r'\W', '', rule_name)
-
-        # 防止"" in "任意字符串" 返回True
-        if not cleaned_ocr or not cleaned_rule:
-            return False
-
-        chars_to_remove = "ー"
-        table = str.maketrans("", "", chars_to_remove)
-        cleaned_ocr = cleaned_ocr.translate(table)
-        cleaned_rule = cleaned_rule.translate(table)
-
-        return cleaned_ocr in cleaned_rule
+    def matched_entries(self) -> list[dict]:
+        """返回当前界面中至少被一张卡片命中的规则，按排名升序排列"""
+        priority_list = self.data.params.priority_list
+        matched = {}
+        for potential in self.data.potentials:
+            for rank, _ in self.data.params.name_index.lookup(potential.name):
+                if rank not in matched and self._is_entry_valid(priority_list[rank], potential):
+                    matched[rank] = priority_list[rank]
+        return [matched[rank] for rank in sorted(matched)]
 
     def _is_entry_valid(self, entry: dict, potential: Potential) -> bool:
         """业务规则过滤器：方便未来随意扩展判定条件"""
@@ -1079,9 +1560,11 @@ class ChoosePotentialAction(CustomAction):
             bool: 返回 True
         """
         node_name = argv.node_name
+        State.load()
         params = self._get_params(context, node_name)
         data = Data(params=params)
         screen = ScreenDataProcessor(context)
+        replay_recorder.start_case(context, node_name, State.owned_potentials)
 
         # 获取只使用一次的数据
         image = context.tasker.controller.post_screencap().wait().get()
@@ -1100,16 +1583,21 @@ class ChoosePotentialAction(CustomAction):
 
         while True:
             # 获取潜能数据，并选择潜能
-            potential = handler.read_potentials_info().choose()
+            handler.read_potentials_info()
+            replay_recorder.capture_screen(context, screen.image, RECORDED_OCR_NODE, RECORDED_NODES)
+            potential = handler.choose()
+            if isinstance(handler, AssistantPriorityHandler):
+                RefreshPlanner.record(data.params.priority_list, handler.matched_entries(), data.refresh_count)
             if potential:
                 break
-            elif data.refreshable:
+            elif data.refreshable and (data.params.chooser != "expected_value" or RefreshPlanner.should_refresh(data)):
                 logger.info("没有找到符合条件的潜能，尝试刷新")
                 handler.refresh()
             else:
                 logger.info("[潜能选择] 没有找到符合条件的潜能，将按照保底顺序选择")
                 potential = handler.choose_fallback_potential()
                 break
+        replay_recorder.finish_case()
 
         # 点击潜能
         click_result = handler.pick(potential)
@@ -1125,6 +1613,9 @@ class ChoosePotentialAction(CustomAction):
                 potential.trekker,
             )
             State.owned_potentials = owned
+            State.record_pick(potential.trekker, potential.name, potential.new_level)
+        else:
+            State.record_pick(None, None, potential.new_level)
 
         return CustomAction.RunResult(success=True)
 
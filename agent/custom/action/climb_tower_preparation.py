@@ -1,15 +1,14 @@
-import os
 import re
-import time
 import json
 from typing import Optional
-from pathlib import Path
 
 from maa.agent.agent_server import AgentServer
 from maa.custom_action import CustomAction
 from maa.context import Context
 
+from utils.preset import PRESET_DIR, catalog
 from utils import logger as logger_module
+from utils.frame_watcher import wait_for_stable
 logger = logger_module.get_logger("climb_tower_preparation")
 
 
@@ -30,9 +29,12 @@ class AscensionPreparation(CustomAction):
             bool: 成功时返回 True，失败时返回 False。
         """
 
+        # 新的爬塔任务可能换了作业或队伍，不再沿用上一次匹配成功的队伍位置
+        SelectParty.last_index = None
+
         # 导入json作业参数
         node_data = context.get_node_data(argv.node_name)
-        preset_path = Path(os.path.abspath(__file__)).parent.parent.parent / "presets"
+        preset_path = PRESET_DIR
         full_path = ""
 
         try:
@@ -42,15 +44,17 @@ class AscensionPreparation(CustomAction):
                 logger.debug("未提供预设作业，将使用默认选项")
                 return True
 
-            # 读取预设作业
+            # 读取预设作业，文件未变化时复用缓存的编译结果
             full_path = (preset_path / preset_name).with_suffix(".json")
-            with open(full_path, "r", encoding="utf-8") as f:
-                presets = json.load(f)
-                priority_list = presets.get("priority_list", [])
-                preset_element = presets.get("element", "")
-                preset_melodies = presets.get("melodies", [])
-                preset_trekker_names = presets.get("trekker_names", [])
-                preset_potential_refresh = presets.get("potential_refresh", 0)
+            entry = catalog.get(preset_name)
+            if entry is None:
+                raise FileNotFoundError(full_path)
+            preset = entry.load()
+            priority_list = preset.priority_list
+            preset_element = preset.element
+            preset_melodies = preset.melodies
+            preset_trekker_names = preset.trekker_names
+            preset_potential_refresh = preset.potential_refresh
 
         except FileNotFoundError:
             logger.error(f"无法找到预设作业文件：{full_path}")
@@ -62,9 +66,8 @@ class AscensionPreparation(CustomAction):
             context.tasker.post_stop()
             return False
 
-        err = self._validate_priority_list(priority_list)
-        if err:
-            logger.error(f"潜能优先级设置校验失败：{err}")
+        if preset.error:
+            logger.error(f"潜能优先级设置校验失败：{preset.error}")
             context.tasker.post_stop()
             return False
 
@@ -78,7 +81,6 @@ class AscensionPreparation(CustomAction):
 
         if preset_element:
             logger.info(f"从作业中检测到预设属性：{preset_element}，将覆盖选项中的属性塔选择")
-            preset_element = preset_element.lower()
             match preset_element:
                 case "aqua" | "ventus" | "水" | "风" | "風":
                     context.override_pipeline({
@@ -146,7 +148,6 @@ class AscensionPreparation(CustomAction):
             node_data = context.get_node_data("星塔_节点_商店_购物_agent")
             shop_attachments = node_data.get("attach", {})
             for melody in preset_melodies:
-                melody = melody.lower()
                 if melody in shop_attachments:
                     context.override_pipeline({
                         "星塔_节点_商店_购物_agent": {
@@ -164,129 +165,6 @@ class AscensionPreparation(CustomAction):
         logger.info(f"已导入预设作业：{preset_name}")
         return True
 
-    @staticmethod
-    def _validate_priority_list(priority_list: object) -> Optional[str]:
-        """宽松校验 priority_list：仅校验关键字段与类型。
-
-        Args:
-            priority_list: 预设作业中的 priority_list 字段
-
-        Returns:
-            Optional[str]: 校验通过时返回 None，否则返回错误信息
-        """
-        if not isinstance(priority_list, list):
-            return f"priority_list 必须是 list，实际是 {type(priority_list).__name__}"
-
-        def _is_non_negative_int(value: object) -> bool:
-            if isinstance(value, bool):
-                return False
-            return isinstance(value, int) and value >= 0
-
-        def _is_positive_int(value: object) -> bool:
-            if isinstance(value, bool):
-                return False
-            return isinstance(value, int) and value > 0
-
-        def _validate_level_range(level_obj: dict, level_path: str) -> Optional[str]:
-            la = level_obj.get("level_at_least")
-            lm = level_obj.get("level_at_most")
-            if la is not None and not _is_non_negative_int(la):
-                return f"{level_path}.level_at_least 必须是非负整数"
-            if lm is not None and not _is_non_negative_int(lm):
-                return f"{level_path}.level_at_most 必须是非负整数"
-            if la is not None and lm is not None and la > lm:
-                return f"{level_path}.level_at_least 不能大于 level_at_most"
-            return None
-
-        def _validate_condition_item(cond_item: dict, cond_path: str) -> Optional[str]:
-            if not isinstance(cond_item, dict):
-                return f"{cond_path} 必须是 dict"
-
-            has_count = ("count_at_least" in cond_item) or ("count_at_most" in cond_item)
-            if has_count:
-                trekker = cond_item.get("trekker")
-                if not isinstance(trekker, str) or not trekker.strip():
-                    return f"{cond_path}.trekker 必须是非空字符串（数量条件必填）"
-
-                ca = cond_item.get("count_at_least")
-                cm = cond_item.get("count_at_most")
-                if ca is not None and not _is_non_negative_int(ca):
-                    return f"{cond_path}.count_at_least 必须是非负整数"
-                if cm is not None and not _is_non_negative_int(cm):
-                    return f"{cond_path}.count_at_most 必须是非负整数"
-                if ca is not None and cm is not None and ca > cm:
-                    return f"{cond_path}.count_at_least 不能大于 count_at_most"
-
-                return _validate_level_range(cond_item, cond_path)
-
-            if "potential" not in cond_item:
-                return f"{cond_path} 缺少 potential（等级条件必填）"
-            if not isinstance(cond_item["potential"], str) or not cond_item["potential"].strip():
-                return f"{cond_path}.potential 必须是非空字符串"
-
-            if "level_at_least" not in cond_item and "level_at_most" not in cond_item:
-                return f"{cond_path} 缺少 level_at_least / level_at_most（至少一个）"
-
-            return _validate_level_range(cond_item, cond_path)
-
-        for i, rule in enumerate(priority_list, start=1):
-            path = f"priority_list[{i}]"
-
-            if not isinstance(rule, dict):
-                return f"{path} 必须是 dict"
-
-            if "potential" not in rule:
-                return f"{path} 缺少必填字段 potential"
-
-            potential = rule["potential"]
-            if isinstance(potential, str):
-                if not potential.strip():
-                    return f"{path}.potential 不能为空字符串"
-            elif isinstance(potential, list):
-                if not potential:
-                    return f"{path}.potential 不能为空列表"
-                for j, name in enumerate(potential, start=1):
-                    if not isinstance(name, str) or not name.strip():
-                        return f"{path}.potential[{j}] 必须是非空字符串"
-            else:
-                return f"{path}.potential 必须是字符串或字符串列表"
-
-            if "trekker" in rule:
-                if not isinstance(rule["trekker"], str) or not rule["trekker"].strip():
-                    return f"{path}.trekker 必须是非空字符串"
-
-            if "level_span" in rule and not _is_positive_int(rule["level_span"]):
-                return f"{path}.level_span 必须是正整数"
-
-            if "max_level" in rule and not _is_positive_int(rule["max_level"]):
-                return f"{path}.max_level 必须是正整数"
-
-            if "refresh" in rule and not _is_non_negative_int(rule["refresh"]):
-                return f"{path}.refresh 必须是非负整数"
-
-            if "condition" in rule:
-                condition = rule["condition"]
-                if not isinstance(condition, list):
-                    return f"{path}.condition 必须是 list，不能是 {type(condition).__name__}"
-
-                for c_idx, branch in enumerate(condition, start=1):
-                    c_path = f"{path}.condition[{c_idx}]"
-                    if isinstance(branch, dict):
-                        err = _validate_condition_item(branch, c_path)
-                        if err:
-                            return err
-                    elif isinstance(branch, list):
-                        if not branch:
-                            return f"{c_path}（OR 分支）不能为空列表"
-                        for b_idx, item in enumerate(branch, start=1):
-                            err = _validate_condition_item(item, f"{c_path}[{b_idx}]")
-                            if err:
-                                return err
-                    else:
-                        return f"{c_path} 必须是 dict 或 list"
-
-        return None
-
 
 @AgentServer.custom_action("select_party")
 class SelectParty(CustomAction):
@@ -296,6 +174,9 @@ class SelectParty(CustomAction):
         "sub1": [235, 466, 170, 55],
         "sub2": [910, 466, 170, 55]
     }
+    TEAM_COUNT = 6
+    # 上一次匹配成功的队伍相对于初始显示队伍的位置，之后的爬塔循环跳过它之前的队伍的识别
+    last_index: Optional[int] = None
 
     def run(
         self,
@@ -304,6 +185,9 @@ class SelectParty(CustomAction):
     ) -> bool:
         """选择队伍
 
+        依次切换队伍，每个队伍对三个名称区域执行一次 OCR。记住上一次匹配成功的队伍位置，
+        之后只识别初始显示的队伍和该位置之后的队伍；找不到时再完整识别一轮所有队伍。
+
         Args:
             context: 任务上下文。
             argv: 自定义动作参数。
@@ -332,45 +216,93 @@ class SelectParty(CustomAction):
         cleaned_main_trekker_names = [name.translate(table) for name in cleaned_main_trekker_names]
         cleaned_sub_trekker_names = [name.translate(table) for name in cleaned_sub_trekker_names]
 
-        for p in range(6):
-            image = context.tasker.controller.post_screencap().wait().get()
-            logger.debug(f"开始识别第{p+1}个队伍")
-            reco_names = []
-            for position, roi in self.NAME_ROI.items():
-                logger.debug(f"开始识别{position}位置的旅人名称")
-                reco_name = self._recognize_trekker_name(context, roi, image)
-                cleaned_reco_name = re.sub(r'\W', '', reco_name)
-                cleaned_reco_name = cleaned_reco_name.translate(table)
-                if "main" in position and cleaned_reco_name in cleaned_main_trekker_names:
-                    reco_names.append(reco_name)
-                elif "sub" in position and cleaned_reco_name in cleaned_sub_trekker_names:
-                    reco_names.append(reco_name)
-            if len(reco_names) == 3:
-                logger.info(f"成功识别到队伍：{reco_names}")
-                return True
-            context.tasker.controller.post_click(1245, 345).wait()
-            time.sleep(1)
-
+        controller = context.tasker.controller
+        skip_until = SelectParty.last_index or 0
+        # 跳过了部分队伍时，多识别一轮作为兜底
+        attempts = self.TEAM_COUNT * 2 if skip_until > 1 else self.TEAM_COUNT
+        image = controller.post_screencap().wait().get()
+        for p in range(attempts):
+            index = p % self.TEAM_COUNT
+            if p == 0 or p >= skip_until:
+                logger.debug(f"开始识别第{index+1}个队伍")
+                reco_names = []
+                for position, reco_name in self._recognize_trekker_names(context, image).items():
+                    cleaned_reco_name = re.sub(r'\W', '', reco_name)
+                    cleaned_reco_name = cleaned_reco_name.translate(table)
+                    if "main" in position and cleaned_reco_name in cleaned_main_trekker_names:
+                        reco_names.append(reco_name)
+                    elif "sub" in position and cleaned_reco_name in cleaned_sub_trekker_names:
+                        reco_names.append(reco_name)
+                if len(reco_names) == 3:
+                    logger.info(f"成功识别到队伍：{reco_names}")
+                    SelectParty.last_index = index
+                    return True
+            controller.post_click(1245, 345).wait()
+            image = wait_for_stable(controller, reference=image, timeout=1.0)
+
+        SelectParty.last_index = None
         logger.error("没有识别到作业对应队伍，请检查旅人名称是否正确，或是否有现成作业的编队")
         context.tasker.post_stop()
         return False
 
-    @staticmethod
-    def _recognize_trekker_name(context, roi, image=None):
+    def _recognize_trekker_names(self, context, image=None) -> dict[str, str]:
         """
-        识别旅人名称
+        对三个名称区域执行一次 OCR，按识别框中心点把结果分配到各个位置
+
+        识别框跨越多个名称区域的结果（文字检测把相邻名称合并在一起）会被丢弃，
+        没有分配到结果的位置再对该位置单独执行一次 OCR。
 
         Args:
             context: 任务上下文。
-            roi: 识别区域。
             image: 图片数据。
 
         Returns:
-            str: 识别到的旅人名称。
+            dict[str, str]: 位置 -> 识别到的旅人名称，未识别到时为空字符串。
         """
         if image is None:
             image = context.tasker.controller.post_screencap().wait().get()
 
+        rois = list(self.NAME_ROI.values())
+        left = min(r[0] for r in rois)
+        top = min(r[1] for r in rois)
+        right = max(r[0] + r[2] for r in rois)
+        bottom = max(r[1] + r[3] for r in rois)
+
+        texts: dict[str, list] = {position: [] for position in self.NAME_ROI}
+        for r in self._ocr_trekker_names(context, image, [left, top, right - left, bottom - top]):
+            overlapped = [position for position, roi in self.NAME_ROI.items() if self._overlaps(r.box, roi)]
+            if len(overlapped) > 1:
+                logger.debug(f"识别结果 {r.text} 跨越了多个名称区域 {overlapped}，已丢弃")
+                continue
+            cx = r.box[0] + r.box[2] / 2
+            cy = r.box[1] + r.box[3] / 2
+            for position, (x, y, w, h) in self.NAME_ROI.items():
+                if x <= cx <= x + w and y <= cy <= y + h:
+                    texts[position].append((r.box[0], r.text))
+                    break
+
+        for position, items in texts.items():
+            if not items:
+                logger.debug(f"{position} 位置没有识别结果，单独识别该位置")
+                items.extend(
+                    (r.box[0], r.text)
+                    for r in self._ocr_trekker_names(context, image, self.NAME_ROI[position])
+                )
+
+        return {
+            position: "".join(text for _, text in sorted(items, key=lambda t: t[0]))
+            for position, items in texts.items()
+        }
+
+    @staticmethod
+    def _overlaps(box: list[int], roi: list[int]) -> bool:
+        return (
+            box[0] < roi[0] + roi[2] and roi[0] < box[0] + box[2]
+            and box[1] < roi[1] + roi[3] and roi[1] < box[1] + box[3]
+        )
+
+    @staticmethod
+    def _ocr_trekker_names(context, image, roi: list[int]) -> list:
         reco_detail = context.run_recognition("星塔_编队角色_识别旅人名称_agent", image, {
             "星塔_编队角色_识别旅人名称_agent": {
                 "recognition": {
@@ -380,14 +312,13 @@ class SelectParty(CustomAction):
                 }
             }
         })
+
         if reco_detail and reco_detail.hit:
             logger.debug(f"识别到旅人名称：{[[r.text, r.score] for r in reco_detail.filtered_results]}")
-            return "".join(r.text for r in reco_detail.filtered_results)
-
-        if reco_detail and reco_detail.all_results:
+            return reco_detail.filtered_results
+        elif reco_detail and reco_detail.all_results:
             logger.debug(f"没有识别到旅人名称")
             logger.debug(f"识别到的结果：{[[r.text, r.score] for r in reco_detail.all_results]}")
         else:
             logger.error(f"识别旅人名称失败")
-
-        return ""
+        return []
@@ -1,5 +1,6 @@
 import re
-from dataclasses import dataclass, field, fields
+import bisect
+from dataclasses import dataclass, field, fields, replace
 from typing import Optional, Any, Self
 
 import numpy
@@ -8,7 +9,10 @@ from maa.agent.agent_server import AgentServer
 from maa.custom_action import CustomAction
 from maa.context import Context
 
+from utils import coin_ledger
 from utils import logger as logger_module
+from utils.frame_watcher import roi_fingerprint
+from utils.ocr_rules import OcrRules
 logger = logger_module.get_logger("climb_tower_shop")
 
 
@@ -74,6 +78,72 @@ def get_enhancement_cost(
     return 65535
 
 
+# 每次付费强化后费用的增量，最后一项为 0 表示此后费用不再增长
+ENHANCE_INCREMENT_STEP = [60, 60, 80, 80, 200, 200, 0]
+
+
+class EnhancementPlan:
+    """强化费用表，用前缀和与二分查找代替逐次模拟。
+
+    从当前强化费用开始，依次列出费用仍会增长的每一次付费强化的费用及累计花费，
+    之后的强化费用恒定，可直接用除法计算次数。同一组 (金币, 当前费用, 初始费用)
+    只需构建一次，不同的单次费用上限都可以复用。
+    """
+
+    def __init__(self, current_coin: int, current_enhancement_cost: int, initial_cost: int):
+        self.current_coin = current_coin
+        self.current_enhancement_cost = current_enhancement_cost
+        self.initial_cost = initial_cost
+
+        # 当前费用为 0 表示有一次免费强化，之后从 initial_cost 开始付费
+        self.free = current_enhancement_cost == 0
+        cost = initial_cost if self.free else current_enhancement_cost
+
+        self.costs: list[int] = []
+        self.prefix: list[int] = []
+        total = 0
+        for step in range(self._get_paid_step(current_enhancement_cost), len(ENHANCE_INCREMENT_STEP) - 1):
+            total += cost
+            self.costs.append(cost)
+            self.prefix.append(total)
+            cost += ENHANCE_INCREMENT_STEP[step]
+        self.tail_cost = cost
+
+    def _get_paid_step(self, current_cost: int) -> int:
+        """根据当前费用推算已经付费强化的次数"""
+        simulated_cost = self.initial_cost
+        step = 0
+        while simulated_cost < current_cost:
+            simulated_cost += ENHANCE_INCREMENT_STEP[min(step, len(ENHANCE_INCREMENT_STEP) - 2)]
+            step += 1
+        return step
+
+    def next_cost(self) -> int:
+        """强化一次后的强化费用"""
+        remaining = self.costs + [self.tail_cost]
+        if self.free:
+            return remaining[0]
+        return remaining[min(1, len(remaining) - 1)]
+
+    def solve(self, max_cost: int) -> tuple[int, int]:
+        """计算单次费用不超过 max_cost 时的可强化次数及总消耗金币数量"""
+        coin = self.current_coin
+        if coin < 0 or max_cost < 0:
+            return 0, 0
+
+        # 费用单调不减，先按单次上限截断，再按金币截断
+        limit = bisect.bisect_right(self.costs, max_cost)
+        count = bisect.bisect_right(self.prefix, coin, hi=limit)
+        total = self.prefix[count - 1] if count else 0
+
+        if count == len(self.costs) and 0 < self.tail_cost <= max_cost:
+            extra = (coin - total) // self.tail_cost
+            count += extra
+            total += extra * self.tail_cost
+
+        return count + self.free, total
+
+
 def calculate_max_enhance(
     current_coin: int,
     current_enhancement_cost: int,
@@ -91,35 +161,7 @@ def calculate_max_enhance(
     Returns:
         tuple[int, int]: 可强化次数，总共消耗的金币数量。
     """
-    increment_step = [60, 60, 80, 80, 200, 200, 0]
-
-    def _get_paid_step(current_cost: int) -> int:
-        simulated_cost = initial_cost
-        step = 0
-        while simulated_cost < current_cost:
-            i = increment_step[min(step, len(increment_step)-2)]
-            simulated_cost += i
-            step += 1
-        return step
-
-    paid_step = _get_paid_step(current_enhancement_cost)
-    total_cost = 0
-    free_count = 0
-    pay_count = 0
-
-    while (current_coin >= current_enhancement_cost
-           and current_enhancement_cost <= max_cost):
-        if current_enhancement_cost == 0:
-            current_enhancement_cost = initial_cost
-            free_count += 1
-        else:
-            current_coin -= current_enhancement_cost
-            total_cost += current_enhancement_cost
-            increment = increment_step[min(paid_step+pay_count, len(increment_step)-1)]
-            current_enhancement_cost += increment
-            pay_count += 1
-
-    return pay_count + free_count, total_cost
+    return EnhancementPlan(current_coin, current_enhancement_cost, initial_cost).solve(max_cost)
 
 def check_shop_type(
     context: Context,
@@ -205,6 +247,75 @@ def is_assist_skill_unlocked(
     return True
 
 
+def _union_roi(rois: list[list[int]]) -> list[int]:
+    """计算多个 ROI 的外接矩形"""
+    left = min(r[0] for r in rois)
+    top = min(r[1] for r in rois)
+    right = max(r[0] + r[2] for r in rois)
+    bottom = max(r[1] + r[3] for r in rois)
+    return [left, top, right - left, bottom - top]
+
+
+def _compile_item_name_patterns(item_names: dict[str, dict[str, list[str]]]) -> dict[str, tuple[re.Pattern, dict[str, str]]]:
+    """为每种语言预编译物品名称的匹配正则。
+
+    所有显示名按长度降序拼成一个分支正则，同一位置优先匹配更长的显示名；
+    正则同时捕获末尾的 "x数量"，一次匹配即可得到名称和数量。
+
+    Returns:
+        dict[str, tuple[re.Pattern, dict[str, str]]]: 语言 → (匹配正则, 显示名 → 内部通用名)。
+    """
+    patterns = {}
+    languages = {lang for translations in item_names.values() for lang in translations}
+    for lang in languages:
+        mapping = {}
+        for key, translations in item_names.items():
+            for name in translations.get(lang, []):
+                mapping.setdefault(name, key)
+        alternation = "|".join(re.escape(name) for name in sorted(mapping, key=len, reverse=True))
+        pattern = re.compile(rf"(?P<name>{alternation}).*?(?:[xX×]\s*(?P<quantity>\d+))?$")
+        patterns[lang] = (pattern, mapping)
+    return patterns
+
+
+class GridRoiIndex:
+    """格子 ROI 的空间索引。
+
+    把每个格子的 price_roi 与 name_roi 按固定大小的网格分桶，
+    整块区域 OCR 后可按识别框中心点直接查到所属的格子和区域类型。
+    """
+
+    def __init__(self, grid_rois: list[dict[str, list[int]]], cell: int = 50):
+        self.cell = cell
+        self.buckets: dict[tuple[int, int], list[tuple[int, str, list[int]]]] = {}
+        for i, grid_roi in enumerate(grid_rois):
+            for kind in ("price_roi", "name_roi"):
+                x, y, w, h = grid_roi[kind]
+                for bx in range(x // cell, (x + w) // cell + 1):
+                    for by in range(y // cell, (y + h) // cell + 1):
+                        self.buckets.setdefault((bx, by), []).append((i, kind, grid_roi[kind]))
+
+    def locate(self, box: list[int]) -> tuple[int, str] | None:
+        """返回识别框中心点所在的 (格子下标, 区域类型)，不在任何区域内时返回 None"""
+        cx = box[0] + box[2] / 2
+        cy = box[1] + box[3] / 2
+        for i, kind, (x, y, w, h) in self.buckets.get((int(cx) // self.cell, int(cy) // self.cell), ()):
+            if x <= cx <= x + w and y <= cy <= y + h:
+                return i, kind
+        return None
+
+
+class MelodyState:
+    """单次爬塔内协奏音符的核实结果，键为音符内部名称，由 AscensionLoop 在每次爬塔结束时重置"""
+    not_assist: set[str] = set()
+    unlocked: set[str] = set()
+
+    @classmethod
+    def reset(cls):
+        cls.not_assist.clear()
+        cls.unlocked.clear()
+
+
 @dataclass
 class Data:
     """商店层数据类"""
@@ -232,15 +343,30 @@ class Data:
     melody_of_luck: bool = False
     melody_of_burst: bool = False
     melody_of_stamina: bool = False
+    # 购买策略，"greedy" 按 priority 顺序依次购买，"solver" 在预算内求总价值最高的购买组合
+    buy_strategy: str = "greedy"
+    # solver 策略中每种商品的价值，默认取标准价
+    item_values: dict[str, int] = field(default_factory=lambda: {
+        "potential_drink": 200,
+        "melody_5": 90,
+        "melody_15": 400,
+    })
     # 强化设置
     initial_cost: int = 60
     max_cost: int = 180
+    # 连续强化多少次后用 OCR 核对一次金币和强化费用
+    enhance_verify_interval: int = 3
     # 动态参数
     shop_type: str = "regular"
     current_coin: int = 0
     refresh_remaining: int = 0
     refresh_cost: int = 65535
     current_cost: int = 65535
+    # 金币账本中是否存在未经 OCR 核对的扣减
+    coin_pending: bool = False
+    # 强化费用表缓存
+    _enhancement_plan: Optional[EnhancementPlan] = field(default=None, init=False, repr=False, compare=False)
+    _enhancement_plan_key: tuple = field(default=(), init=False, repr=False, compare=False)
 
     @classmethod
     def get_from_dict(cls, data: dict[str, Any]) -> Self:
@@ -294,24 +420,39 @@ class Data:
             logger.error("无法计算理论最低可购买商品价格，本错误将导致无法执行刷新")
             return 65535
 
+    @property
+    def enhancement_plan(self) -> EnhancementPlan:
+        """当前金币和强化费用下的强化费用表，仅在 current_coin、current_cost 或 initial_cost 变化时重新构建"""
+        key = (self.current_coin, self.current_cost, self.initial_cost)
+        if self._enhancement_plan is None or self._enhancement_plan_key != key:
+            self._enhancement_plan = EnhancementPlan(*key)
+            self._enhancement_plan_key = key
+        return self._enhancement_plan
+
+    def apply_enhancement(self) -> None:
+        """按强化费用模型更新一次强化后的金币和强化费用"""
+        next_cost = self.enhancement_plan.next_cost()
+        self.current_coin -= self.current_cost
+        self.current_cost = next_cost
+
     @property
     def enhancement_cost(self) -> int:
-        _, coin = calculate_max_enhance(self.current_coin, self.current_cost, self.max_cost, self.initial_cost)
+        _, coin = self.enhancement_plan.solve(self.max_cost)
         return coin
 
     @property
     def greedy_enhancement_cost(self) -> int:
-        _, coin = calculate_max_enhance(self.current_coin, self.current_cost, 65535, self.initial_cost)
+        _, coin = self.enhancement_plan.solve(65535)
         return coin
 
     @property
     def enhancement_count(self) -> int:
-        count, _ = calculate_max_enhance(self.current_coin, self.current_cost, self.max_cost, self.initial_cost)
+        count, _ = self.enhancement_plan.solve(self.max_cost)
         return count
 
     @property
     def greedy_enhancement_count(self) -> int:
-        count, _ = calculate_max_enhance(self.current_coin, self.current_cost, 65535, self.initial_cost)
+        count, _ = self.enhancement_plan.solve(65535)
         return count
     
 
@@ -451,8 +592,52 @@ class GridInfo:
                 return "assist_melody"
 
         return ""
-        
-        
+
+
+@dataclass
+class GridCache:
+    """
+    单次商店访问内的格子识别缓存，由 ShopAction.run 在每次进入商店时新建
+
+    指纹为格子名称与价格区域的原始像素，名称、数量或价格的任何一笔变化都会让指纹不同，
+    因此复用的识别结果不会带着过期的价格或数量。
+
+    grids: 格子下标 -> (语言, 指纹, 识别结果)。
+    sold_out: 购买后已售罄格子的指纹，命中的格子不再识别。
+    """
+    # 单个像素任一通道的差值超过该值时视为变化
+    PIXEL_TOLERANCE = 24
+    # 允许变化的像素数，超过时视为不同画面
+    MAX_CHANGED_PIXELS = 4
+
+    grids: dict[int, tuple[str, numpy.ndarray, GridInfo]] = field(default_factory=dict)
+    sold_out: list[numpy.ndarray] = field(default_factory=list)
+
+    @staticmethod
+    def fingerprint(image: numpy.ndarray, grid_roi: dict[str, list[int]]) -> numpy.ndarray:
+        """格子名称与价格区域的原始像素，按像素展开后拼接"""
+        return numpy.concatenate([
+            roi_fingerprint(image, grid_roi[kind], step=1).reshape(-1, image.shape[2])
+            for kind in ("name_roi", "price_roi")
+        ])
+
+    @classmethod
+    def same(cls, a: numpy.ndarray, b: numpy.ndarray) -> bool:
+        if a.shape != b.shape:
+            return False
+        changed = numpy.count_nonzero(numpy.abs(a - b).max(axis=1) > cls.PIXEL_TOLERANCE)
+        return changed <= cls.MAX_CHANGED_PIXELS
+
+    def is_sold_out(self, fingerprint: numpy.ndarray) -> bool:
+        return any(self.same(fingerprint, f) for f in self.sold_out)
+
+    def get(self, index: int, lang_type: str, fingerprint: numpy.ndarray) -> Optional[GridInfo]:
+        cached = self.grids.get(index)
+        if cached and cached[0] == lang_type and self.same(fingerprint, cached[1]):
+            return replace(cached[2])
+        return None
+
+
 class ShopHandler:
     priority_counter: int = 1
 
@@ -502,6 +687,59 @@ class ShopHandler:
                     target_grids.append(grid)
         return ShopHandler(target_grids, self.context, self.data)
 
+    def solver_buy_plan(self) -> Self:
+        """在预算内选出总价值最高的购买组合，替代 normal_buy_plan。
+
+        候选格子与 normal_buy_plan 相同，预算为当前金币减去预留给强化的金币。
+        格子最多 8 个，直接枚举全部组合，总价值相同时选总价更低的组合。
+        选中的格子按 priority 和价格排序后打标。
+
+        Returns:
+            Self: 打标后的格子列表。
+        """
+        candidates = []
+        for grid in sorted(self._grids, key=lambda g: g.item_price):
+            for type_index, target_type in enumerate(self.data.priority):
+                buy_type = grid.is_match_normal_buy_plan(target_type, self.data)
+                if buy_type:
+                    candidates.append((type_index, grid, buy_type))
+                    break
+
+        budget = self.data.current_coin - self.data.enhancement_cost
+        values = [self._item_value(grid) for _, grid, _ in candidates]
+        best_mask, best_value, best_price = 0, 0, 0
+        for mask in range(1, 1 << len(candidates)):
+            price = value = 0
+            for i, (_, grid, _) in enumerate(candidates):
+                if mask >> i & 1:
+                    price += grid.item_price
+                    value += values[i]
+            if price > budget:
+                continue
+            if value > best_value or (value == best_value and price < best_price):
+                best_mask, best_value, best_price = mask, value, price
+
+        chosen = sorted(
+            (c for i, c in enumerate(candidates) if best_mask >> i & 1),
+            key=lambda c: (c[0], c[1].item_price),
+        )
+        target_grids = []
+        for _, grid, buy_type in chosen:
+            grid.buy_type = buy_type
+            grid.buy_priority = self.__class__.priority_counter
+            self.__class__.priority_counter += 1
+            target_grids.append(grid)
+        logger.debug(f"预算 {budget}，最优组合总价 {best_price}，总价值 {best_value}：{[g.display_name for g in target_grids]}")
+        return ShopHandler(target_grids, self.context, self.data)
+
+    def _item_value(self, grid: GridInfo) -> int:
+        """solver 策略中单个格子的价值"""
+        if grid.item_name == "potential_drink":
+            key = "potential_drink"
+        else:
+            key = f"melody_{grid.item_quantity}"
+        return self.data.item_values.get(key, 0)
+
     def high_price_drinks_buy_plan(self) -> Self:
         grids = sorted(
             [g for g in self._grids
@@ -540,20 +778,41 @@ class ShopHandler:
             self.__class__.priority_counter += 1
         return ShopHandler(grids, self.context, self.data)
 
+    def spend_coin(self, amount: int) -> None:
+        """从金币账本中扣除已知花费，等到下一次核对时再与 OCR 结果比对"""
+        self.data.current_coin -= amount
+        self.data.coin_pending = True
+
+    def sync_coin(self, image: Optional[numpy.ndarray] = None) -> None:
+        """用 OCR 核对金币账本，不一致时以识别结果为准"""
+        coin = get_current_coin(self.context, image)
+        if self.data.coin_pending and coin != self.data.current_coin:
+            logger.debug(f"账本金币 {self.data.current_coin} 与识别结果 {coin} 不一致，以识别结果为准")
+        self.data.current_coin = coin
+        self.data.coin_pending = False
+
     def buy(self) -> bool:
         """对实例中的所有格子依次执行购买操作，购买成功成标记 bought 为 True。
         用户中止时立即返回 False；
         购买失败则输出日志并继续。
 
+        金币由本地账本维护：购买成功后扣除商品价格，购买潜能特饮后刷新潜能的花费
+        由潜能选择通过 coin_ledger 记入账本，仅在账本金币不足以购买或购买失败时才用 OCR 核对。
+
         Returns:
             bool: 未被用户中止时返回 True；用户中止时返回 False。
         """
 
+        with coin_ledger.active(self):
+            return self._buy_grids()
+
+    def _buy_grids(self) -> bool:
         for grid in self._grids:
             if self.context.tasker.stopping:
                 return False
 
-            self.data.current_coin = get_current_coin(self.context)
+            if not grid.can_afford(self.data) and self.data.coin_pending:
+                self.sync_coin()
             if not grid.can_afford(self.data):
                 reserved_coin = grid.get_reserved_coin(self.data)
                 logger.debug(f"当前金币 {self.data.current_coin}，预留给强化的金币 {reserved_coin}")
@@ -567,6 +826,9 @@ class ShopHandler:
                 if grid.checked:
                     logger.debug(f"跳过已检查的协奏音符 {grid.display_name}")
                     continue
+                if self._is_checked_in_run(grid):
+                    grid.checked = True
+                    continue
                 success = self._buy_assist_melody(grid)
             elif grid.buy_type == "final_remainder":
                 success = self._buy_item(grid)
@@ -576,8 +838,10 @@ class ShopHandler:
 
             if success:
                 grid.bought = True
+                self.spend_coin(grid.item_price)
             else:
                 logger.debug(f"购买失败，跳过第{grid.grid_num}个格子")
+                self.sync_coin()
 
         return True
 
@@ -613,6 +877,23 @@ class ShopHandler:
             logger.error(f"购买 {grid.item_name} 过程出现问题")
             return False
 
+    def _is_checked_in_run(self, grid: GridInfo) -> bool:
+        """本次爬塔中已核实不是协奏音符或协奏技能已解锁的音符返回 True，调用方直接跳过，不再打开购买对话框。
+
+        Args:
+            grid: 单个格子信息对象。
+
+        Returns:
+            bool: 无需再次核实时返回 True。
+        """
+        if grid.item_name in MelodyState.not_assist:
+            logger.debug(f"{grid.display_name} 已核实不是协奏音符，跳过")
+            return True
+        if self.data.buy_assist_before_unlock and grid.item_name in MelodyState.unlocked:
+            logger.debug(f"{grid.display_name} 的协奏技能已核实解锁，跳过")
+            return True
+        return False
+
     def _buy_assist_melody(self, grid: GridInfo) -> bool:
         """执行协奏音符购买，走单独的协奏音符 pipeline。
 
@@ -639,10 +920,12 @@ class ShopHandler:
         reco_detail = self.context.run_recognition("星塔_节点_商店_购买协奏音符_核实协奏_agent", image)
         if not(reco_detail and reco_detail.hit):
             logger.debug("该音符不是协奏音符")
+            MelodyState.not_assist.add(grid.item_name)
             passed = False
         # 验证协奏技能是否解锁
         elif self.data.buy_assist_before_unlock and is_assist_skill_unlocked(self.context, image):
             logger.debug("协奏技能已解锁，无需购买")
+            MelodyState.unlocked.add(grid.item_name)
             passed = False
 
         # 如果没有通过验证，关闭确认框
@@ -741,6 +1024,10 @@ class ShopAction(CustomAction):
         },
     ]
 
+    # 整个购物面板的识别范围，以及用于把识别结果分配回各个格子的空间索引
+    PANEL_ROI = _union_roi([g[kind] for g in GRID_ROIS for kind in ("price_roi", "name_roi")])
+    GRID_INDEX = GridRoiIndex(GRID_ROIS)
+
     ITEM_NAMES= {
         "potential_drink": {
             "cn": ["潜能特饮", "能特", "特饮"],
@@ -828,6 +1115,8 @@ class ShopAction(CustomAction):
         }
     }
 
+    ITEM_NAME_PATTERNS = _compile_item_name_patterns(ITEM_NAMES)
+
     ITEM_STANDARD_PRICES: dict[str, int] = {
         "potential_drink": 200,
         "melody_5": 90,
@@ -848,7 +1137,7 @@ class ShopAction(CustomAction):
     ) -> bool:
         """商店楼层自动购买主流程。
 
-        读取配置参数后按 priority 循环购买，每轮结束后执行第二轮溢购饮料，
+        读取配置参数后按 priority（或 solver 策略的最优组合）循环购买，每轮结束后执行第二轮溢购饮料，
         满足条件则刷新并重新购买；循环结束后 final 商店追加补买饮料和零头购买。
 
         Args:
@@ -859,6 +1148,8 @@ class ShopAction(CustomAction):
             bool: 正常完成返回 True；用户中止返回 False。
         """
         data = self._get_data(context, argv.node_name)
+        # 整块识别中价格文字的处理规则，每次执行时从价格识别节点读取一次
+        self._price_rules = OcrRules.from_node(context, "星塔_节点_商店_购物_识别物品价格_agent")
         logger.debug(
             f"当前强化费用: {data.current_cost}, "
             f"最大当前强化费用: {data.max_cost}, 初始强化费用: {data.initial_cost}"
@@ -867,23 +1158,32 @@ class ShopAction(CustomAction):
 
         context.run_task("星塔_节点_商店_点击商店购物_agent")
 
+        # 格子识别缓存只在本次商店访问内有效
+        cache = GridCache()
         while True:
             image = context.tasker.controller.post_screencap().wait().get()
             data.refresh_remaining = self._get_refresh_remaining(context, image)
             data.refresh_cost = self._get_refresh_cost(context, image)
-            grids = self._get_grids(context, data, image)
+            grids = self._get_grids(context, data, image, cache)
             handler = ShopHandler(grids, context, data)
 
-            handler.normal_buy_plan().buy()
+            if data.buy_strategy == "solver":
+                handler.solver_buy_plan().buy()
+            else:
+                handler.normal_buy_plan().buy()
             handler.high_price_drinks_buy_plan().buy()
 
             if context.tasker.stopping:
                 return False
 
-            data.current_coin = get_current_coin(context)
+            # 刷新前用 OCR 核对一次金币账本，同时记下已购买格子售罄后的画面指纹
+            image = context.tasker.controller.post_screencap().wait().get()
+            self._remember_sold_out(grids, image, cache)
+            handler.sync_coin(image)
             if not handler.should_refresh():
                 break
             context.run_task("星塔_节点_商店_点击刷新_agent")
+            handler.spend_coin(data.refresh_cost)
 
         if data.shop_type == "final":
             handler.remaining_drinks_buy_plan().buy()
@@ -914,6 +1214,8 @@ class ShopAction(CustomAction):
         node_data = context.get_node_data(node_name)
         attach = node_data.get("attach", {})
         data = Data().get_from_dict(attach)
+        # item_values 可以只写需要修改的商品，其余商品沿用默认价值
+        data.item_values = {**Data().item_values, **attach.get("item_values", {})}
         data.shop_type = check_shop_type(context, image)
 
         # 强化参数
@@ -926,46 +1228,91 @@ class ShopAction(CustomAction):
 
         return data
 
-    def _get_grids(self, context: Context, data: Data, image=None) -> list[GridInfo]:
+    def _get_grids(self, context: Context, data: Data, image=None, cache: Optional[GridCache] = None) -> list[GridInfo]:
         """识别购物界面 8 个格子的道具信息。
 
-        每个格子识别名称、数量、价格，计算折扣比值后组装为 GridInfo，
-        并初始化 bought、buy_type、buy_priority 字段。
-        识别完成后按价格升序排列。
+        先按名称与价格区域的画面指纹跳过已售罄的格子，并直接复用画面未变化格子的识别结果；
+        其余格子所在区域执行一次 OCR，按空间索引把结果分配到各个格子，
+        解析出名称、数量、价格后组装为 GridInfo；整块识别解析失败的格子再单独识别。
 
         Args:
             context: 任务上下文。
             data: 商店配置参数。
+            image: 截图，默认 None。
+            cache: 本次商店访问的格子识别缓存，默认 None 即不使用缓存。
 
         Returns:
             GridManager: 格子信息列表，每个元素包含 grid_num、item_name、
                 item_quantity、item_price、display_name等字段。
         """
+        if image is None:
+            image = context.tasker.controller.post_screencap().wait().get()
+
         grids_info = []
         lang_type = data.lang_type
-
-        for i, grid_roi in enumerate(self.GRID_ROIS):
-            logger.debug(f"正在识别第 {i + 1} 个格子")
-            item_name, item_quantity, item_price = self._get_single_grid_info(
-                context, grid_roi["price_roi"], grid_roi["name_roi"], lang_type, image
-            )
+        if cache is None:
+            cache = GridCache()
+        fingerprints = [GridCache.fingerprint(image, grid_roi) for grid_roi in self.GRID_ROIS]
+
+        pending = []
+        for i, fingerprint in enumerate(fingerprints):
+            if cache.is_sold_out(fingerprint):
+                logger.debug(f"第 {i + 1} 个格子已售罄，跳过识别")
+                continue
+            cached = cache.get(i, lang_type, fingerprint)
+            if cached is not None:
+                logger.debug(f"第 {i + 1} 个格子画面未变化，复用识别结果")
+                grids_info.append(cached)
+            else:
+                pending.append(i)
+
+        panel_texts = []
+        if pending:
+            panel_roi = _union_roi([
+                self.GRID_ROIS[i][kind] for i in pending for kind in ("price_roi", "name_roi")
+            ])
+            panel_texts = self._get_panel_texts(context, image, panel_roi)
+
+        for i in pending:
+            grid_roi = self.GRID_ROIS[i]
+            raw_item_price, raw_item_name = panel_texts[i]
+            item_name, item_quantity, item_price = self._parse_grid_texts(raw_item_price, raw_item_name, lang_type)
+            if not (item_name and item_quantity and item_price):
+                logger.debug(f"整块识别第 {i + 1} 个格子失败，改为单独识别")
+                item_name, item_quantity, item_price = self._get_single_grid_info(
+                    context, grid_roi["price_roi"], grid_roi["name_roi"], lang_type, image
+                )
             if item_name and item_quantity and item_price:
-                grids_info.append(GridInfo(
+                grid = GridInfo(
                     grid_num=i + 1,
                     item_name=item_name,
                     item_quantity=item_quantity,
                     item_price=item_price,
                     display_name=ShopAction.ITEM_NAMES.get(item_name, {}).get(data.lang_type, ["?"])[0]
-                ))
+                )
+                grids_info.append(grid)
+                cache.grids[i] = (lang_type, fingerprints[i], replace(grid))
             else:
+                cache.grids.pop(i, None)
                 logger.error(
                     f"第 {i + 1} 个格子内容识别失败："
                     f"item_name={item_name}, item_quantity={item_quantity}, item_price={item_price}"
                 )
 
+        grids_info.sort(key=lambda g: g.grid_num)
         logger.debug(f"道具列表: {grids_info}")
         return grids_info
 
+    def _remember_sold_out(self, grids: list[GridInfo], image: numpy.ndarray, cache: GridCache) -> None:
+        """记录本轮已购买格子的画面指纹，之后画面相同的格子视为已售罄"""
+        for grid in grids:
+            if not grid.bought:
+                continue
+            fingerprint = GridCache.fingerprint(image, self.GRID_ROIS[grid.grid_num - 1])
+            if not cache.is_sold_out(fingerprint):
+                cache.sold_out.append(fingerprint)
+            cache.grids.pop(grid.grid_num - 1, None)
+
     def _get_single_grid_info(
         self,
         context: Context,
@@ -992,21 +1339,66 @@ class ShopAction(CustomAction):
 
         results = self._grid_recognition(context, image, price_roi, "price")
         raw_item_price = [r.text for r in results]
-        item_price = self._parse_item_price(raw_item_price)
-        logger.debug(f"价格从 '{raw_item_price}' 解析为 '{item_price}'")
 
         results = self._grid_recognition(context, image, name_roi, "name")
         raw_item_name = "".join([r.text for r in results])
-        item_name, item_quantity = self._parse_item_name(raw_item_name, lang_type)
-        logger.debug(
-            f"名称从 '{raw_item_name}' 解析为名称: '{item_name}'，数量: '{item_quantity}'"
-        )
 
+        item_name, item_quantity, item_price = self._parse_grid_texts(raw_item_price, raw_item_name, lang_type)
         if not (item_name and item_quantity and item_price):
             logger.warning("识别道具格子失败")
 
         return item_name, item_quantity, item_price
 
+    def _get_panel_texts(
+        self, context: Context, image: numpy.ndarray, roi: Optional[list[int]] = None
+    ) -> list[tuple[list[str], str]]:
+        """对整个购物面板执行一次 OCR，按空间索引把识别结果分配到各个格子。
+
+        价格区域的文字按价格识别节点（星塔_节点_商店_购物_识别物品价格_agent）的
+        replace、threshold 与 expected 处理，与单独识别格子时一致。
+        名称区域的文字按从左到右的顺序拼接。
+
+        Args:
+            context: 任务上下文。
+            image: 截图。
+            roi: 识别范围，默认为整个购物面板。
+
+        Returns:
+            list[tuple[list[str], str]]: 每个格子的 (价格文字列表, 名称文字)，顺序与 GRID_ROIS 一致。
+        """
+        prices: list[list[str]] = [[] for _ in self.GRID_ROIS]
+        names: list[list[tuple[int, str]]] = [[] for _ in self.GRID_ROIS]
+
+        for r in self._grid_recognition(context, image, roi or self.PANEL_ROI, "name"):
+            located = self.GRID_INDEX.locate(r.box)
+            if located is None:
+                continue
+            i, kind = located
+            if kind == "price_roi":
+                text = self._price_rules.apply(r.text, r.score)
+                if text is not None:
+                    prices[i].append(text)
+            else:
+                names[i].append((r.box[0], r.text))
+
+        return [
+            (prices[i], "".join(text for _, text in sorted(names[i], key=lambda n: n[0])))
+            for i in range(len(self.GRID_ROIS))
+        ]
+
+    def _parse_grid_texts(
+        self, raw_item_price: list[str], raw_item_name: str, lang_type: str
+    ) -> tuple[str, int, int]:
+        """从单个格子的价格和名称文字中解析出 (item_name, item_quantity, item_price)"""
+        item_price = self._parse_item_price(raw_item_price)
+        logger.debug(f"价格从 '{raw_item_price}' 解析为 '{item_price}'")
+
+        item_name, item_quantity = self._parse_item_name(raw_item_name, lang_type)
+        logger.debug(
+            f"名称从 '{raw_item_name}' 解析为名称: '{item_name}'，数量: '{item_quantity}'"
+        )
+        return item_name, item_quantity, item_price
+
     @staticmethod
     def _grid_recognition(
         context: Context,
@@ -1052,7 +1444,7 @@ class ShopAction(CustomAction):
     def _parse_item_name(self, item_name: str, lang_type: str) -> tuple[str, int]:
         """从 OCR 原始字符串中解析物品内部名称和数量。
 
-        先按 "名称 x数量" 格式拆分，再将语言显示名映射为程序内部通用名称。
+        用预编译的语言正则一次匹配出显示名和 "x数量"，并将显示名映射为程序内部通用名称。
         潜能特饮数量统一视为 1。
 
         Args:
@@ -1061,27 +1453,21 @@ class ShopAction(CustomAction):
 
         Returns:
             tuple[str, int]: (item_name, item_quantity)，
-                item_name 为内部通用名，item_quantity 为数量（0 表示未识别）。
+                item_name 为内部通用名，item_quantity 为数量（0 表示未识别）；
+                没有匹配到任何显示名时返回 ("", 0)。
         """
-        mapping = self._get_reverse_mapping(lang_type)
-        match = re.match(r"(.*?)\s*[x×]\s*(\d+)$", item_name, re.IGNORECASE)
-        item_quantity = 0
-
-        if match:
-            item_name = match.group(1).strip()
-            if match.group(2):
-                item_quantity = int(match.group(2).strip())
-
-        if item_name not in self.ITEM_NAMES:
-            for m in mapping:
-                if m in item_name:
-                    item_name = mapping[m]
-                    break
+        if lang_type not in self.ITEM_NAME_PATTERNS:
+            logger.error(f"未知的语言类型: {lang_type}")
+            return "", 0
 
-        if item_name == "potential_drink":
-            item_quantity = 1
+        pattern, names = self.ITEM_NAME_PATTERNS[lang_type]
+        match = pattern.search(item_name)
+        if not match:
+            return "", 0
 
-        return item_name, item_quantity
+        name = names[match.group("name")]
+        quantity = 1 if name == "potential_drink" else int(match.group("quantity") or 0)
+        return name, quantity
 
     @staticmethod
     def _parse_item_price(item_price: int | list) -> int:
@@ -1165,21 +1551,6 @@ class ShopAction(CustomAction):
         logger.debug("无法识别刷新费用，可能是刷新用完，也有可能识别错误。返回 65535")
         return 65535
 
-    def _get_reverse_mapping(self, lang_type: str) -> dict[str, str]:
-        """根据语言类型生成显示名到内部名的反向查找表。
-
-        Args:
-            lang_type: 游戏语言类型（cn/tw/en/jp）。
-
-        Returns:
-            dict[str, str]: 显示名 → 内部通用名的映射字典。
-        """
-        reverse_map = {}
-        for key, translations in self.ITEM_NAMES.items():
-            for name in translations.get(lang_type, []):
-                reverse_map[name] = key
-        return reverse_map
-
 
 @AgentServer.custom_action("enhance_action")
 class EnhanceAction(CustomAction):
@@ -1193,6 +1564,8 @@ class EnhanceAction(CustomAction):
 
         regular 商店按 max_cost 限制单次强化上限；
         final 商店强制将上限设为 65535，以花光剩余金币为目标。
+        每次强化后按费用模型更新金币和强化费用，每 enhance_verify_interval 次用 OCR 核对一次；
+        强化失败时立即用 OCR 核对，金币和费用都没有变化说明已经没有潜能可以强化，直接结束。
 
         Args:
             context: 任务上下文。
@@ -1202,6 +1575,7 @@ class EnhanceAction(CustomAction):
             bool: 始终返回 True。
         """
         data = self._get_data(context, argv.node_name)
+        max_cost = data.max_cost if data.shop_type == "regular" else 65535
         count = data.enhancement_count if data.shop_type == "regular" else data.greedy_enhancement_count
 
         logger.debug(f"最大强化金币: {data.max_cost}，强化递增金额: {data.initial_cost}")
@@ -1216,13 +1590,50 @@ class EnhanceAction(CustomAction):
             }
         }
 
-        for _ in range(count):
+        unverified = 0
+        failed = False
+        while data.current_coin >= data.current_cost and data.current_cost <= max_cost:
+            if context.tasker.stopping:
+                break
+
+            expected = (data.current_coin, data.current_cost)
             run_result = context.run_task("星塔_节点_商店_点击强化_agent", pipeline_override)
             if not (run_result and run_result.status.succeeded):
-                logger.warning("强化失败，可能已经没有潜能可以强化")
+                self._verify(context, data)
+                if (data.current_coin, data.current_cost) == expected:
+                    logger.warning("强化失败，金币和强化费用都没有变化，已经没有潜能可以强化")
+                    break
+                if failed:
+                    logger.warning("连续强化失败，停止强化")
+                    break
+                logger.warning("强化流程出现问题，但金币或强化费用已变化，继续强化")
+                failed = True
+                unverified = 0
+                continue
+
+            failed = False
             logger.debug("强化成功")
+            data.apply_enhancement()
+            unverified += 1
+            if unverified >= data.enhance_verify_interval:
+                self._verify(context, data)
+                unverified = 0
         return True
 
+    @staticmethod
+    def _verify(context: Context, data: Data) -> None:
+        """用 OCR 核对金币和强化费用，不一致时以识别结果为准"""
+        image = context.tasker.controller.post_screencap().wait().get()
+        coin = get_current_coin(context, image)
+        cost = get_enhancement_cost(context, image)
+        if (coin, cost) != (data.current_coin, data.current_cost):
+            logger.debug(
+                f"模型金币 {data.current_coin}、强化费用 {data.current_cost} "
+                f"与识别结果 {coin}、{cost} 不一致，以识别结果为准"
+            )
+        data.current_coin = coin
+        data.current_cost = cost
+
     @staticmethod
     def _get_data(context: Context, node_name: str) -> Data:
         """从节点 attach 读取强化配置参数，缺失时返回安全默认值。
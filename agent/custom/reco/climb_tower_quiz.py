@@ -1,3 +1,5 @@
+import re
+
 import numpy as np
 from maa.agent.agent_server import AgentServer
 from maa.custom_recognition import CustomRecognition
@@ -15,6 +17,7 @@ class QuizRecognition(CustomRecognition):
         3: [670, 250, 590, 325],
         4: [670, 200, 590, 450]
     }
+
     def analyze(
             self,
             context: Context,
@@ -24,6 +27,8 @@ class QuizRecognition(CustomRecognition):
         default_box = [0, 0, 0, 0]
 
         # 根据选项数量定位roi
+        # 选项数量仍用模板匹配：模板只匹配可选的选项按钮，金币不足时只有部分选项可选，
+        # OCR 同样会读到不可选选项的文字，无法区分
         reco_result = context.run_recognition("星塔_节点_随便选择_agent", argv.image)
         if reco_result and reco_result.hit:
             answer_count = len(reco_result.filtered_results)
@@ -38,14 +43,17 @@ class QuizRecognition(CustomRecognition):
             logger.error(f"[问题选择] 检测选项个数出现问题")
             return CustomRecognition.AnalyzeResult(box=None, detail={})
 
-        # 寻找最佳答案
+        # 在最宽的 roi 上执行一次 OCR，最佳答案和 650 金币选项都从同一组结果中查找
         roi = self.ROIS[answer_count]
-        result_box = self._get_best_answer(context, argv.image, roi)
+        results = self._read_options(context, argv.image, roi)
+
+        # 寻找最佳答案
+        result_box = self._get_best_answer(context, argv.image, roi, results)
         if result_box:
             return CustomRecognition.AnalyzeResult(box=result_box, detail={})
 
         # 寻找赌 650 金币的答案
-        result_box = self._get_650_answer(context, argv.image, roi)
+        result_box = self._get_650_answer(context, results)
         if result_box:
             return CustomRecognition.AnalyzeResult(box=result_box, detail={})
 
@@ -55,14 +63,15 @@ class QuizRecognition(CustomRecognition):
         # save_image(argv.image, f"未知选项")
         return CustomRecognition.AnalyzeResult(box=default_box, detail={})
 
-    @staticmethod
-    def _get_best_answer(context: Context, image: np.ndarray, roi: list) -> Rect | None:
+    def _read_options(self, context: Context, image: np.ndarray, roi: list) -> list:
+        """在最宽的 roi 上执行一次 OCR，返回中心点落在当前选项数量对应 roi 内的结果"""
         pipeline_override = {
             "星塔_节点_进行对话选择_agent":
                 {
                      "recognition": {
                          "param": {
-                             "roi": roi
+                             "roi": self.ROIS[max(self.ROIS)],
+                             "expected": [".+"]
                          }
                     }
                 }
@@ -72,18 +81,35 @@ class QuizRecognition(CustomRecognition):
             image,
             pipeline_override=pipeline_override
         )
-        if reco_result and reco_result.hit:
-            target_text = reco_result.best_result.text
-            target_box = reco_result.best_result.box
-            logger.info(f"[问题选择] 选择答案：{target_text}")
-            return target_box
+        if not (reco_result and reco_result.hit):
+            return []
+
+        x, y, w, h = roi
+        return [
+            r for r in reco_result.filtered_results
+            if x <= r.box[0] + r.box[2] / 2 <= x + w and y <= r.box[1] + r.box[3] / 2 <= y + h
+        ]
+
+    @staticmethod
+    def _get_best_answer(context: Context, image: np.ndarray, roi: list, results: list) -> Rect | None:
+        """按 星塔_节点_进行对话选择_agent 中 expected 的顺序查找最佳答案，读取不到 expected 时单独识别"""
+        node_data = context.get_node_data("星塔_节点_进行对话选择_agent") or {}
+        expected = node_data.get("recognition", {}).get("param", {}).get("expected", [])
+        if not expected:
+            return QuizRecognition._recognize_best_answer(context, image, roi)
+
+        for pattern in expected:
+            for r in results:
+                if re.search(pattern, r.text):
+                    logger.info(f"[问题选择] 选择答案：{r.text}")
+                    return r.box
 
         return None
 
     @staticmethod
-    def _get_650_answer(context: Context, image: np.ndarray, roi: list) -> list | None:
+    def _recognize_best_answer(context: Context, image: np.ndarray, roi: list) -> Rect | None:
         pipeline_override = {
-            "星塔_节点_进行对话选择_寻找650金币选项_agent":
+            "星塔_节点_进行对话选择_agent":
                 {
                      "recognition": {
                          "param": {
@@ -93,17 +119,32 @@ class QuizRecognition(CustomRecognition):
                 }
         }
         reco_result = context.run_recognition(
-            "星塔_节点_进行对话选择_寻找650金币选项_agent",
+            "星塔_节点_进行对话选择_agent",
             image,
             pipeline_override=pipeline_override
         )
         if reco_result and reco_result.hit:
             target_text = reco_result.best_result.text
             target_box = reco_result.best_result.box
-            logger.info(f"[问题选择] 选择650金币的选项")
-            logger.debug(target_text)
+            logger.info(f"[问题选择] 选择答案：{target_text}")
+            return target_box
+
+        return None
+
+    @staticmethod
+    def _get_650_answer(context: Context, results: list) -> list | None:
+        """按 星塔_节点_进行对话选择_寻找650金币选项_agent 中的 expected 与 threshold 查找650金币选项"""
+        node_data = context.get_node_data("星塔_节点_进行对话选择_寻找650金币选项_agent") or {}
+        param = node_data.get("recognition", {}).get("param", {})
+        expected = param.get("expected") or ["650"]
+        threshold = param.get("threshold", 0.3)
+        for r in results:
+            if r.score >= threshold and any(re.search(pattern, r.text) for pattern in expected):
+                target_box = r.box
+                logger.info(f"[问题选择] 选择650金币的选项")
+                logger.debug(r.text)
 
-            fixed_box = [target_box[0], target_box[1]-55, target_box[2]-100, target_box[3]]
-            return fixed_box
+                fixed_box = [target_box[0], target_box[1]-55, target_box[2]-100, target_box[3]]
+                return fixed_box
 
         return None
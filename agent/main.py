@@ -18,6 +18,15 @@ if os.getenv("APP_DEBUG", "false").lower() == "true":
     from utils import logger
     logger.debug_mode()
 
+# 开启性能分析
+if os.getenv("APP_PROFILE", "false").lower() == "true":
+    from utils import profiler
+    profiler.enable()
+
+# 录制潜能选择回放用例，保存到 APP_RECORD_DIR 指定的目录
+if os.getenv("APP_RECORD_DIR"):
+    from utils import replay_recorder
+    replay_recorder.enable(Path(os.getenv("APP_RECORD_DIR")))
 
 
 def main():
@@ -34,6 +43,9 @@ def main():
     AgentServer.join()
     AgentServer.shut_down()
 
+    from utils import profiler
+    profiler.dump("agent 退出")
+
 
 if __name__ == "__main__":
     main()
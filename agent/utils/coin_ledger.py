@@ -0,0 +1,42 @@
+"""
+星塔金币账本的登记入口
+
+商店购买潜能特饮时，潜能选择在嵌套的 run_task 中执行，刷新潜能同样会花费金币。
+商店在购买期间把自己的账本登记为当前账本，潜能选择刷新时通过 spend() 记账，
+商店无需依赖潜能模块的状态。没有登记账本时（例如战斗后的潜能选择）spend() 不做任何事。
+
+使用方法：
+    from utils import coin_ledger
+
+    with coin_ledger.active(handler):   # handler 需提供 spend_coin(amount)
+        ...
+
+    coin_ledger.spend(refresh_cost)
+"""
+
+from contextlib import contextmanager
+from typing import Iterator, Optional, Protocol
+
+
+class Ledger(Protocol):
+    def spend_coin(self, amount: int) -> None: ...
+
+
+_ledger: Optional[Ledger] = None
+
+
+@contextmanager
+def active(ledger: Ledger) -> Iterator[Ledger]:
+    """在 with 块内把 ledger 登记为当前账本"""
+    global _ledger
+    previous, _ledger = _ledger, ledger
+    try:
+        yield ledger
+    finally:
+        _ledger = previous
+
+
+def spend(amount: int) -> None:
+    """向当前账本记一笔花费，没有登记账本时忽略"""
+    if _ledger is not None:
+        _ledger.spend_coin(amount)
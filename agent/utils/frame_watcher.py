@@ -0,0 +1,131 @@
+"""
+基于画面变化的等待功能，用来代替固定时长的 time.sleep
+
+通过定时截图并比较降采样后的画面来判断界面是否稳定，条件满足或画面稳定后立即返回，
+同时保证不会超过给定的最长等待时间。
+
+使用方法：
+    from utils.frame_watcher import wait_for_stable, wait_until
+
+    # 等待画面从 image 变化并稳定下来，最多等待 1 秒
+    image = wait_for_stable(controller, reference=image, timeout=1.0)
+
+    # 等待条件成立，roi 区域画面不变时不会重复执行条件判断
+    ok, image = wait_until(controller, lambda img: not has_overlay(img), timeout=10.0, roi=OVERLAY_ROI)
+"""
+
+import time
+from typing import Callable, Optional
+
+import numpy as np
+
+
+# 降采样步长，1280x720 的截图降采样后为 160x90
+DOWNSAMPLE_STEP: int = 8
+# 降采样画面的平均像素差低于该值时视为同一画面
+SAME_FRAME_THRESHOLD: float = 3.0
+
+
+def downsample(image: np.ndarray, step: int = DOWNSAMPLE_STEP) -> np.ndarray:
+    """对截图进行降采样，返回可直接做差的 int16 数组"""
+    return image[::step, ::step].astype(np.int16)
+
+
+def frame_diff(a: np.ndarray, b: np.ndarray) -> float:
+    """计算两张降采样画面的平均像素差，尺寸不一致时视为完全不同"""
+    if a.shape != b.shape:
+        return 255.0
+    return float(np.abs(a - b).mean())
+
+
+def is_same_frame(a: np.ndarray, b: np.ndarray, threshold: float = SAME_FRAME_THRESHOLD) -> bool:
+    """判断两张降采样画面是否为同一画面"""
+    return frame_diff(a, b) < threshold
+
+
+def roi_fingerprint(image: np.ndarray, roi: list[int], step: int = DOWNSAMPLE_STEP // 2) -> np.ndarray:
+    """截取 roi 区域并降采样，作为该区域的画面指纹，可用 is_same_frame 比较"""
+    x, y, w, h = roi
+    return downsample(image[y:y + h, x:x + w], step)
+
+
+def _screencap(controller) -> np.ndarray:
+    return controller.post_screencap().wait().get()
+
+
+def wait_for_stable(
+    controller,
+    reference: Optional[np.ndarray] = None,
+    timeout: float = 1.0,
+    interval: float = 0.05,
+    threshold: float = SAME_FRAME_THRESHOLD,
+) -> np.ndarray:
+    """等待画面稳定后返回最新截图。
+
+    相邻两次截图相同即视为稳定。传入 reference 时，还要求画面与 reference 不同，
+    即等待画面发生变化并稳定下来。超过 timeout 后直接返回最后一次截图。
+
+    Args:
+        controller: maa 控制器
+        reference: 可选的参照截图
+        timeout: 最长等待时间（秒）
+        interval: 截图间隔（秒）
+        threshold: 判断为同一画面的平均像素差阈值
+
+    Returns:
+        np.ndarray: 最后一次截图
+    """
+    deadline = time.monotonic() + timeout
+    reference_small = downsample(reference) if reference is not None else None
+
+    image = _screencap(controller)
+    previous = downsample(image)
+    while time.monotonic() < deadline:
+        time.sleep(interval)
+        image = _screencap(controller)
+        current = downsample(image)
+        stable = is_same_frame(previous, current, threshold)
+        changed = reference_small is None or not is_same_frame(reference_small, current, threshold)
+        if stable and changed:
+            return image
+        previous = current
+    return image
+
+
+def wait_until(
+    controller,
+    predicate: Callable[[np.ndarray], bool],
+    timeout: float = 10.0,
+    interval: float = 0.1,
+    threshold: float = SAME_FRAME_THRESHOLD,
+    roi: Optional[list[int]] = None,
+) -> tuple[bool, np.ndarray]:
+    """等待条件成立。
+
+    只有画面相对上一次判断发生变化时才会重新执行 predicate，
+    避免在静止画面上重复进行识别。predicate 只关心画面中的一小块区域时应传入 roi，
+    只比较该区域的画面指纹，否则小区域的变化会被整个画面的平均像素差淹没。
+
+    Args:
+        controller: maa 控制器
+        predicate: 条件判断函数，参数为截图
+        timeout: 最长等待时间（秒）
+        interval: 截图间隔（秒）
+        threshold: 判断为同一画面的平均像素差阈值
+        roi: 可选的比较区域，默认比较整个画面
+
+    Returns:
+        tuple[bool, np.ndarray]: (条件是否成立, 最后一次截图)，超时返回 False
+    """
+    deadline = time.monotonic() + timeout
+    last_checked = None
+    while True:
+        image = _screencap(controller)
+        current = roi_fingerprint(image, roi) if roi is not None else downsample(image)
+        if last_checked is None or not is_same_frame(last_checked, current, threshold):
+            if predicate(image):
+                return True, image
+            last_checked = current
+        if time.monotonic() >= deadline:
+            return False, image
+        time.sleep(interval)
@@ -0,0 +1,52 @@
+"""
+按 OCR 节点 recognition.param 中的规则处理其他节点识别到的文字
+
+一次 OCR 覆盖多个字段时（潜能卡片、商店格子），各字段的文字需要按单独识别时所用节点的
+replace、threshold 与 expected 处理。规则直接从节点读取，修改 pipeline 后两种识别方式保持一致。
+
+使用方法：
+    from utils.ocr_rules import OcrRules
+
+    rules = OcrRules.from_node(context, "星塔_节点_商店_购物_识别物品价格_agent")
+    texts = rules.filter([(r.text, r.score) for r in results])
+"""
+
+import re
+from dataclasses import dataclass, field
+
+
+@dataclass(slots=True)
+class OcrRules:
+    replace: list[list[str]] = field(default_factory=list)
+    expected: list[str] = field(default_factory=list)
+    # 与 MaaFramework OCR 的默认 threshold 一致
+    threshold: float = 0.3
+
+    @classmethod
+    def from_node(cls, context, node_name: str) -> "OcrRules":
+        node_data = context.get_node_data(node_name) or {}
+        param = node_data.get("recognition", {}).get("param", {})
+        return cls(
+            replace=param.get("replace", []),
+            expected=param.get("expected", []),
+            threshold=param.get("threshold", 0.3),
+        )
+
+    def apply(self, text: str, score: float) -> str | None:
+        """处理单条识别结果，分数低于 threshold 或替换后不匹配任一 expected 时返回 None"""
+        if score < self.threshold:
+            return None
+        for pattern, repl in self.replace:
+            text = re.sub(pattern, repl, text)
+        if self.expected and not any(re.search(pattern, text) for pattern in self.expected):
+            return None
+        return text
+
+    def filter(self, results: list[tuple[str, float]]) -> list[str]:
+        """处理 (text, score) 列表，返回通过筛选的文本"""
+        texts = []
+        for text, score in results:
+            text = self.apply(text, score)
+            if text is not None:
+                texts.append(text)
+        return texts
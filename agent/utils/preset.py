@@ -0,0 +1,341 @@
+"""
+预设作业的读取、校验与缓存
+
+预设作业编译后（校验结果、属性、音符、队伍等）按文件路径缓存在内存中，
+文件的修改时间和大小不变时直接复用编译结果。
+priority_list 只做校验、按原样保存：它要通过 attach 传给潜能选择节点，
+由 PriorityRules 解析，内容不变时 State.get_priority_rules 复用上一次的解析结果。
+
+PresetCatalog 只扫描一次预设作业目录，按队伍和语言建立索引并记录文件大小和修改时间，
+文件内容和哈希在第一次使用时才读取。
+
+本模块不依赖 maa，离线工具（tools/validate_presets.py）也直接使用。
+
+使用方法：
+    from utils.preset import catalog, load_preset
+
+    preset = load_preset(path)
+    if preset.error:
+        ...
+
+    entry = catalog.get("xiaohe_canglan_duona_cn")
+    variants = catalog.by_team("xiaohe_canglan_duona")  # 语言 -> PresetEntry
+"""
+
+import json
+import hashlib
+from typing import Optional, Any, Iterator
+from pathlib import Path
+from dataclasses import dataclass, field
+
+from utils import logger as logger_module
+logger = logger_module.get_logger("preset")
+
+
+PRESET_DIR: Path = Path(__file__).resolve().parents[1] / "presets"
+
+
+@dataclass(slots=True)
+class CompiledPreset:
+    """编译后的预设作业"""
+    path: str
+    mtime_ns: int
+    size: int
+    # 原样保存的 priority_list，不做规范化
+    priority_list: list[dict[str, Any]] = field(default_factory=list)
+    element: str = ""
+    melodies: list[str] = field(default_factory=list)
+    trekker_names: dict[str, list[str]] = field(default_factory=dict)
+    potential_refresh: int = 0
+    # priority_list 的校验错误，校验通过时为 None
+    error: Optional[str] = None
+
+
+_cache: dict[str, CompiledPreset] = {}
+
+
+def compile_preset(path: Path, raw: dict[str, Any], mtime_ns: int = 0, size: int = 0) -> CompiledPreset:
+    """校验 priority_list 并规范化属性、音符等字段，priority_list 按原样保存"""
+    priority_list = raw.get("priority_list", [])
+    return CompiledPreset(
+        path=str(path),
+        mtime_ns=mtime_ns,
+        size=size,
+        priority_list=priority_list,
+        element=str(raw.get("element", "")).lower(),
+        melodies=[str(m).lower() for m in raw.get("melodies", [])],
+        trekker_names=raw.get("trekker_names", {}),
+        potential_refresh=raw.get("potential_refresh", 0),
+        error=validate_priority_list(priority_list),
+    )
+
+
+def load_preset(path: Path) -> CompiledPreset:
+    """读取预设作业，文件未变化时复用内存中的编译结果。
+
+    Args:
+        path: 预设作业文件路径
+
+    Returns:
+        CompiledPreset: 编译后的预设作业
+
+    Raises:
+        FileNotFoundError: 文件不存在
+        json.JSONDecodeError: 文件不是合法的 json
+    """
+    path = Path(path).resolve()
+    stat = path.stat()
+    key = str(path)
+
+    preset = _cache.get(key)
+    if preset and preset.mtime_ns == stat.st_mtime_ns and preset.size == stat.st_size:
+        return preset
+
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    preset = compile_preset(path, raw, stat.st_mtime_ns, stat.st_size)
+    _cache[key] = preset
+    return preset
+
+
+def iter_priority_list_errors(priority_list: object) -> Iterator[str]:
+    """宽松校验 priority_list：仅校验关键字段与类型，依次产出所有错误信息。
+
+    同一条规则或条件中，后续校验依赖前面的字段时（例如字段类型错误），跳过这些后续校验。
+
+    Args:
+        priority_list: 预设作业中的 priority_list 字段
+
+    Yields:
+        str: 错误信息
+    """
+    if not isinstance(priority_list, list):
+        yield f"priority_list 必须是 list，实际是 {type(priority_list).__name__}"
+        return
+
+    def _is_non_negative_int(value: object) -> bool:
+        if isinstance(value, bool):
+            return False
+        return isinstance(value, int) and value >= 0
+
+    def _is_positive_int(value: object) -> bool:
+        if isinstance(value, bool):
+            return False
+        return isinstance(value, int) and value > 0
+
+    def _level_range_errors(level_obj: dict, level_path: str) -> Iterator[str]:
+        la = level_obj.get("level_at_least")
+        lm = level_obj.get("level_at_most")
+        la_valid = la is None or _is_non_negative_int(la)
+        lm_valid = lm is None or _is_non_negative_int(lm)
+        if not la_valid:
+            yield f"{level_path}.level_at_least 必须是非负整数"
+        if not lm_valid:
+            yield f"{level_path}.level_at_most 必须是非负整数"
+        if la_valid and lm_valid and la is not None and lm is not None and la > lm:
+            yield f"{level_path}.level_at_least 不能大于 level_at_most"
+
+    def _condition_item_errors(cond_item: dict, cond_path: str) -> Iterator[str]:
+        if not isinstance(cond_item, dict):
+            yield f"{cond_path} 必须是 dict"
+            return
+
+        has_count = ("count_at_least" in cond_item) or ("count_at_most" in cond_item)
+        if has_count:
+            trekker = cond_item.get("trekker")
+            if not isinstance(trekker, str) or not trekker.strip():
+                yield f"{cond_path}.trekker 必须是非空字符串（数量条件必填）"
+
+            ca = cond_item.get("count_at_least")
+            cm = cond_item.get("count_at_most")
+            ca_valid = ca is None or _is_non_negative_int(ca)
+            cm_valid = cm is None or _is_non_negative_int(cm)
+            if not ca_valid:
+                yield f"{cond_path}.count_at_least 必须是非负整数"
+            if not cm_valid:
+                yield f"{cond_path}.count_at_most 必须是非负整数"
+            if ca_valid and cm_valid and ca is not None and cm is not None and ca > cm:
+                yield f"{cond_path}.count_at_least 不能大于 count_at_most"
+
+            yield from _level_range_errors(cond_item, cond_path)
+            return
+
+        if "potential" not in cond_item:
+            yield f"{cond_path} 缺少 potential（等级条件必填）"
+        elif not isinstance(cond_item["potential"], str) or not cond_item["potential"].strip():
+            yield f"{cond_path}.potential 必须是非空字符串"
+
+        if "level_at_least" not in cond_item and "level_at_most" not in cond_item:
+            yield f"{cond_path} 缺少 level_at_least / level_at_most（至少一个）"
+            return
+
+        yield from _level_range_errors(cond_item, cond_path)
+
+    for i, rule in enumerate(priority_list, start=1):
+        path = f"priority_list[{i}]"
+
+        if not isinstance(rule, dict):
+            yield f"{path} 必须是 dict"
+            continue
+
+        if "potential" not in rule:
+            yield f"{path} 缺少必填字段 potential"
+        else:
+            potential = rule["potential"]
+            if isinstance(potential, str):
+                if not potential.strip():
+                    yield f"{path}.potential 不能为空字符串"
+            elif isinstance(potential, list):
+                if not potential:
+                    yield f"{path}.potential 不能为空列表"
+                for j, name in enumerate(potential, start=1):
+                    if not isinstance(name, str) or not name.strip():
+                        yield f"{path}.potential[{j}] 必须是非空字符串"
+            else:
+                yield f"{path}.potential 必须是字符串或字符串列表"
+
+        if "trekker" in rule:
+            if not isinstance(rule["trekker"], str) or not rule["trekker"].strip():
+                yield f"{path}.trekker 必须是非空字符串"
+
+        if "level_span" in rule and not _is_positive_int(rule["level_span"]):
+            yield f"{path}.level_span 必须是正整数"
+
+        if "max_level" in rule and not _is_positive_int(rule["max_level"]):
+            yield f"{path}.max_level 必须是正整数"
+
+        if "refresh" in rule and not _is_non_negative_int(rule["refresh"]):
+            yield f"{path}.refresh 必须是非负整数"
+
+        if "condition" in rule:
+            condition = rule["condition"]
+            if not isinstance(condition, list):
+                yield f"{path}.condition 必须是 list，不能是 {type(condition).__name__}"
+                continue
+
+            for c_idx, branch in enumerate(condition, start=1):
+                c_path = f"{path}.condition[{c_idx}]"
+                if isinstance(branch, dict):
+                    yield from _condition_item_errors(branch, c_path)
+                elif isinstance(branch, list):
+                    if not branch:
+                        yield f"{c_path}（OR 分支）不能为空列表"
+                    for b_idx, item in enumerate(branch, start=1):
+                        yield from _condition_item_errors(item, f"{c_path}[{b_idx}]")
+                else:
+                    yield f"{c_path} 必须是 dict 或 list"
+
+
+def validate_priority_list(priority_list: object) -> Optional[str]:
+    """宽松校验 priority_list，返回第一个错误。
+
+    Args:
+        priority_list: 预设作业中的 priority_list 字段
+
+    Returns:
+        Optional[str]: 校验通过时返回 None，否则返回错误信息
+    """
+    return next(iter_priority_list_errors(priority_list), None)
+
+
+@dataclass(slots=True)
+class PresetEntry:
+    """预设作业目录中的一个文件，size 和 mtime_ns 来自扫描时的 stat"""
+    name: str
+    team: str
+    language: str
+    path: Path
+    size: int
+    mtime_ns: int
+    # (计算时的 mtime_ns, SHA-1)
+    _sha1: Optional[tuple[int, str]] = field(default=None, repr=False, compare=False)
+
+    @classmethod
+    def from_path(cls, path: Path, languages: tuple[str, ...]) -> "PresetEntry":
+        team, _, language = path.stem.rpartition("_")
+        if language not in languages:
+            team, language = path.stem, ""
+        stat = path.stat()
+        return cls(
+            name=path.stem,
+            team=team,
+            language=language,
+            path=path.resolve(),
+            size=stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+        )
+
+    @property
+    def sha1(self) -> str:
+        """文件内容的 SHA-1，第一次访问时计算，mtime_ns 不变时复用"""
+        if self._sha1 is None or self._sha1[0] != self.mtime_ns:
+            self._sha1 = (self.mtime_ns, hashlib.sha1(self.path.read_bytes()).hexdigest())
+        return self._sha1[1]
+
+    def load(self) -> CompiledPreset:
+        """读取并编译预设作业，结果由 load_preset 缓存"""
+        return load_preset(self.path)
+
+
+class PresetCatalog:
+    """预设作业目录的索引，文件名格式为 <队伍>_<语言>.json"""
+
+    LANGUAGES = ("cn", "en", "jp", "tw")
+
+    def __init__(self, preset_dir: Path = PRESET_DIR):
+        self.preset_dir = preset_dir
+        self._entries: Optional[dict[str, PresetEntry]] = None
+        self._teams: dict[str, dict[str, PresetEntry]] = {}
+
+    def scan(self) -> None:
+        """重新扫描预设作业目录，大小和修改时间都没变的文件沿用之前的条目及其哈希"""
+        previous = self._entries or {}
+        entries = {}
+        teams: dict[str, dict[str, PresetEntry]] = {}
+        for path in sorted(self.preset_dir.glob("*.json")):
+            entry = PresetEntry.from_path(path, self.LANGUAGES)
+            old = previous.get(entry.name)
+            if old and old.size == entry.size and old.mtime_ns == entry.mtime_ns:
+                entry = old
+            entries[entry.name] = entry
+            teams.setdefault(entry.team, {})[entry.language] = entry
+        self._entries = entries
+        self._teams = teams
+        logger.debug(f"扫描到 {len(entries)} 个预设作业，共 {len(teams)} 个队伍")
+
+    @property
+    def entries(self) -> dict[str, PresetEntry]:
+        self._ensure_scanned()
+        return self._entries
+
+    def _ensure_scanned(self) -> None:
+        if self._entries is None:
+            self.scan()
+
+    def get(self, name: str) -> Optional[PresetEntry]:
+        """按文件名（可带 .json 后缀）查找预设作业，找不到时重新扫描一次目录。
+
+        名称带有子目录等、不是目录中的文件名时，与以前一样按 <preset_dir>/<name>.json 直接查找。
+        """
+        path = (self.preset_dir / name).with_suffix(".json")
+        if path.parent != self.preset_dir:
+            return PresetEntry.from_path(path, self.LANGUAGES) if path.is_file() else None
+
+        name = path.stem
+        entry = self.entries.get(name)
+        if entry is None:
+            self.scan()
+            entry = self.entries.get(name)
+        return entry
+
+    def teams(self) -> list[str]:
+        self._ensure_scanned()
+        return list(self._teams)
+
+    def by_team(self, team: str) -> dict[str, PresetEntry]:
+        """返回队伍的所有语言版本，语言 -> PresetEntry"""
+        self._ensure_scanned()
+        return self._teams.get(team, {})
+
+
+catalog = PresetCatalog()
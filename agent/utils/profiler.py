@@ -0,0 +1,161 @@
+"""
+按节点统计识别、任务和截图耗时的性能分析功能
+
+开启后会替换 Context.run_recognition、Context.run_task 和 Controller.post_screencap，
+记录每个节点名的调用次数和耗时分布，并在 dump() 时输出汇总表。未开启时 dump() 不做任何事。
+
+使用方法：
+    from utils import profiler
+
+    profiler.enable()   # main.py 中通过环境变量 APP_PROFILE=true 开启
+    ...
+    profiler.dump("完成一次爬塔")
+"""
+
+import time
+import threading
+from dataclasses import dataclass, field
+
+from utils import logger as logger_module
+logger = logger_module.get_logger("profiler")
+
+
+# 耗时分布的桶上限（毫秒），最后一个桶收纳所有更慢的调用
+BUCKET_BOUNDS_MS: list[float] = [5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+SCREENCAP_NAME: str = "<screencap>"
+
+
+@dataclass(slots=True)
+class NodeStats:
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+    buckets: list[int] = field(default_factory=lambda: [0] * (len(BUCKET_BOUNDS_MS) + 1))
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        ms = seconds * 1000
+        index = next((i for i, bound in enumerate(BUCKET_BOUNDS_MS) if ms <= bound), len(BUCKET_BOUNDS_MS))
+        self.buckets[index] += 1
+
+    def percentile(self, q: float) -> float:
+        """根据分桶估算分位数，返回所在桶的上限（毫秒）"""
+        target = self.count * q
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= target:
+                return BUCKET_BOUNDS_MS[i] if i < len(BUCKET_BOUNDS_MS) else float("inf")
+        return float("inf")
+
+
+_enabled: bool = False
+_lock = threading.Lock()
+# (类型, 节点名) -> 统计数据，类型为 "reco"、"task" 或 "screencap"
+_stats: dict[tuple[str, str], NodeStats] = {}
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def record(kind: str, name: str, seconds: float):
+    with _lock:
+        stats = _stats.get((kind, name))
+        if stats is None:
+            stats = _stats[(kind, name)] = NodeStats()
+        stats.add(seconds)
+
+
+class _TimedJob:
+    """包装截图 Job，在 wait() 完成时记录从发起截图到完成的耗时"""
+
+    def __init__(self, job, start: float):
+        self._job = job
+        self._start = start
+        self._recorded = False
+
+    def wait(self):
+        self._job.wait()
+        if not self._recorded:
+            self._recorded = True
+            record("screencap", SCREENCAP_NAME, time.perf_counter() - self._start)
+        return self
+
+    def __getattr__(self, name):
+        return getattr(self._job, name)
+
+
+def enable():
+    """开启性能分析，替换 Context 与 Controller 上的相关方法，重复调用无副作用"""
+    global _enabled
+    if _enabled:
+        return
+
+    from maa.context import Context
+    from maa.controller import Controller
+
+    original_run_recognition = Context.run_recognition
+    original_run_task = Context.run_task
+    original_post_screencap = Controller.post_screencap
+
+    def run_recognition(self, entry, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return original_run_recognition(self, entry, *args, **kwargs)
+        finally:
+            record("reco", entry, time.perf_counter() - start)
+
+    def run_task(self, entry, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return original_run_task(self, entry, *args, **kwargs)
+        finally:
+            record("task", entry, time.perf_counter() - start)
+
+    def post_screencap(self, *args, **kwargs):
+        start = time.perf_counter()
+        return _TimedJob(original_post_screencap(self, *args, **kwargs), start)
+
+    Context.run_recognition = run_recognition
+    Context.run_task = run_task
+    Controller.post_screencap = post_screencap
+
+    _enabled = True
+    logger.debug("性能分析已开启")
+
+
+def dump(reason: str = "", reset: bool = True) -> str:
+    """输出各节点的耗时汇总，按总耗时降序排列。
+
+    Args:
+        reason: 输出原因，写在汇总表标题中
+        reset: 输出后是否清空已记录的数据
+
+    Returns:
+        str: 汇总文本；未开启或没有数据时返回空字符串
+    """
+    if not _enabled:
+        return ""
+
+    with _lock:
+        items = sorted(_stats.items(), key=lambda kv: kv[1].total, reverse=True)
+        if reset:
+            _stats.clear()
+
+    if not items:
+        return ""
+
+    total = sum(s.total for _, s in items)
+    lines = [f"性能分析汇总（{reason}），总耗时 {total:.1f}s："]
+    lines.append(f"{'类型':<10}{'次数':>6}{'总耗时s':>10}{'平均ms':>9}{'P90ms':>8}{'最大ms':>9}  节点")
+    for (kind, name), s in items:
+        avg = s.total / s.count * 1000
+        lines.append(
+            f"{kind:<10}{s.count:>6}{s.total:>10.2f}{avg:>9.1f}{s.percentile(0.9):>8.0f}{s.max * 1000:>9.1f}  {name}"
+        )
+    summary = "\n".join(lines)
+    logger.info(summary)
+    return summary
@@ -0,0 +1,127 @@
+"""
+录制潜能选择回放用例，供 tools/potential_replay_benchmark.py 离线回放
+
+开启后，每次潜能选择会在录制目录下生成一个用例子目录，记录每个潜能界面的截图、
+整张截图上未经任何节点筛选的 OCR 结果、非 OCR 节点的识别结果，以及用到的节点的 node data。
+回放时 OCR 节点按各自的 roi、replace、threshold 与 expected 处理同一份 OCR 结果，
+逐个识别和批量识别两种读取方式都与游戏内的识别过程一致。未开启时各函数不做任何事。
+
+截图需要 PIL 才能保存，便携版 python 中只录制识别结果，回放时使用黑屏代替截图。
+
+使用方法：
+    from utils import replay_recorder
+
+    replay_recorder.enable(record_dir)   # main.py 中通过环境变量 APP_RECORD_DIR 开启
+    replay_recorder.start_case(context, node_name, owned_potentials)
+    replay_recorder.capture_screen(context, image, ocr_node, node_names)
+    replay_recorder.finish_case()
+"""
+
+import json
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
+try:
+    from PIL import Image
+    HAS_PIL = True
+except ImportError:
+    Image = None
+    HAS_PIL = False
+
+from utils import logger as logger_module
+logger = logger_module.get_logger("replay_recorder")
+
+
+_record_dir: Optional[Path] = None
+_case_dir: Optional[Path] = None
+_case: Optional[dict[str, Any]] = None
+
+
+def is_enabled() -> bool:
+    return _record_dir is not None
+
+
+def enable(record_dir: Path):
+    """开启录制，用例保存在 record_dir 下"""
+    global _record_dir
+    _record_dir = Path(record_dir)
+    _record_dir.mkdir(parents=True, exist_ok=True)
+    logger.debug(f"潜能选择录制已开启，保存到 {_record_dir}")
+
+
+def start_case(context, node_name: str, owned_potentials: dict):
+    """开始录制一次潜能选择，记录节点 attach 与当前已拥有的潜能"""
+    global _case_dir, _case
+    if not is_enabled():
+        return
+
+    _case_dir = _record_dir / time.strftime("%Y%m%d_%H%M%S")
+    suffix = 1
+    while _case_dir.exists():
+        suffix += 1
+        _case_dir = _record_dir / f"{time.strftime('%Y%m%d_%H%M%S')}_{suffix}"
+    _case_dir.mkdir(parents=True)
+
+    node_data = context.get_node_data(node_name) or {}
+    _case = {
+        "attach": node_data.get("attach", {}),
+        "owned_potentials": json.loads(json.dumps(owned_potentials)),
+        "nodes": {node_name: node_data},
+        "screens": [],
+    }
+
+
+def capture_screen(context, image: np.ndarray, ocr_node: str, node_names: list[str]):
+    """录制一个潜能界面。
+
+    Args:
+        context: maa.context.Context
+        image: 本次读取潜能信息所用的截图
+        ocr_node: 用于整张截图 OCR 的节点，录制其 all_results
+        node_names: 潜能选择用到的节点，OCR 节点只录制 node data，其他节点额外录制识别结果
+    """
+    if _case is None or image is None:
+        return
+
+    index = len(_case["screens"])
+    screen: dict[str, Any] = {"ocr": [], "recognition": {}}
+
+    height, width = image.shape[:2]
+    override = {ocr_node: {"recognition": {"param": {"roi": [0, 0, width, height]}}}}
+    reco_detail = context.run_recognition(ocr_node, image, override)
+    if reco_detail:
+        screen["ocr"] = [_dump_result(r) for r in reco_detail.all_results]
+
+    for name in node_names:
+        node_data = context.get_node_data(name) or {}
+        _case["nodes"][name] = node_data
+        if node_data.get("recognition", {}).get("type") == "OCR":
+            continue
+        reco_detail = context.run_recognition(name, image)
+        screen["recognition"][name] = [_dump_result(r) for r in reco_detail.filtered_results] if reco_detail else []
+
+    if HAS_PIL:
+        screen["image"] = f"{index}.png"
+        # maa 截图为 BGR 格式
+        Image.fromarray(image[:, :, ::-1], mode="RGB").save(_case_dir / screen["image"])
+
+    _case["screens"].append(screen)
+
+
+def finish_case():
+    """结束录制，写出 case.json"""
+    global _case_dir, _case
+    if _case is None:
+        return
+
+    with open(_case_dir / "case.json", "w", encoding="utf-8") as f:
+        json.dump(_case, f, ensure_ascii=False, indent=2)
+    logger.debug(f"已录制潜能选择用例 {_case_dir.name}，共 {len(_case['screens'])} 个界面")
+    _case_dir = None
+    _case = None
+
+
+def _dump_result(result) -> dict[str, Any]:
+    return {"text": getattr(result, "text", ""), "box": list(result.box), "score": result.score}
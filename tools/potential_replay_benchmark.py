@@ -0,0 +1,367 @@
+# -*- coding: utf-8 -*-
+
+"""
+潜能选择离线回放基准测试
+
+使用录制好的潜能界面截图与识别结果，通过桩 Context 驱动 ChoosePotentialAction，
+分别统计 default / default+ / json 三种潜能处理方式的决策速度、每次决策的识别次数，
+以及各阶段（读取、选择、刷新、点击、识别）的耗时。修改 climb_tower_potential.py 后，
+可以先用本工具离线对比性能，不必每次都在游戏里实测。
+
+录制用例：
+    启动 agent 时设置环境变量 APP_RECORD_DIR=<record_dir>，之后每次潜能选择都会由
+    utils/replay_recorder.py 在 <record_dir> 下生成一个用例。
+
+录制目录结构（每个子目录是一个用例）：
+    <record_dir>/
+        <case_name>/
+            case.json
+            0.png          # 可选，截图；未安装 PIL 或缺失时使用黑屏代替
+            1.png
+
+case.json 结构：
+    {
+        "attach": {...},            // 可选，覆盖 星塔_节点_选择潜能_agent 的 attach
+        "owned_potentials": {...},  // 可选，json 处理方式使用的已拥有潜能
+        "nodes": {...},             // 可选，节点名 -> 录制时的 node data，缺失的节点读取本仓库的爬塔 pipeline
+        "screens": [                // 按刷新顺序排列的界面，点击刷新后切换到下一个
+            {
+                "image": "0.png",
+                // 整张截图上未经任何节点筛选的 OCR 结果
+                "ocr": [
+                    {"text": "螺旋风涡", "box": [220, 390, 120, 30], "score": 0.95}
+                ],
+                // 非 OCR 节点（模板匹配等）的识别结果，节点名 -> 识别结果
+                "recognition": {
+                    "星塔_节点_选择潜能_识别推荐图标_agent": [
+                        {"box": [146, 389, 43, 44], "score": 0.9}
+                    ]
+                }
+            }
+        ]
+    }
+
+OCR 节点的识别与 MaaFramework 一致：取中心点落在 roi（pipeline_override 或节点本身的 roi）内的
+"ocr" 结果，按节点的 replace 替换文字，再按 threshold 与 expected 筛选并按 order_by 排序。
+因此逐个识别和批量识别两种读取方式回放的是同一份 OCR 结果，各字段按各自节点的规则处理。
+非 OCR 节点直接返回 "recognition" 中录制的结果，同样按 roi 筛选。
+
+使用方法：
+    python tools/potential_replay_benchmark.py <record_dir> [--handler json default+ default]
+        [--read-mode separate batch] [--preset agent/presets/xxx.json] [--repeat 20]
+"""
+
+import re
+import sys
+import json
+import time
+import argparse
+import tempfile
+from pathlib import Path
+from collections import defaultdict
+
+import numpy as np
+
+AGENT_DIR = Path(__file__).resolve().parent.parent / "agent"
+if str(AGENT_DIR) not in sys.path:
+    sys.path.insert(0, str(AGENT_DIR))
+
+from custom.action import climb_tower_potential  # noqa: E402
+
+try:
+    from PIL import Image
+    HAS_PIL = True
+except ImportError:
+    Image = None
+    HAS_PIL = False
+
+
+PIPELINE_DIR = AGENT_DIR.parent / "assets" / "resource" / "base" / "pipeline" / "climb_tower"
+ACTION_NODE = "星塔_节点_选择潜能_agent"
+BLANK_SCREEN = np.zeros((720, 1280, 3), dtype=np.uint8)
+REFRESH_TASK = "星塔_节点_选择潜能_点击刷新_agent"
+STAGES = {
+    "read_potentials_info": "读取",
+    "choose": "选择",
+    "choose_fallback_potential": "兜底选择",
+    "refresh": "刷新",
+    "pick": "点击",
+}
+
+
+class _Result:
+    def __init__(self, raw: dict):
+        self.text = raw.get("text", "")
+        self.box = list(raw.get("box", [0, 0, 0, 0]))
+        self.score = raw.get("score", 1.0)
+
+
+class _RecoDetail:
+    def __init__(self, filtered_results: list[_Result], all_results: list[_Result]):
+        self.filtered_results = filtered_results
+        self.all_results = all_results
+        self.best_result = max(filtered_results, key=lambda r: r.score) if filtered_results else None
+        self.hit = bool(filtered_results)
+
+
+_pipeline: dict[str, dict] = {}
+
+
+def load_pipeline() -> dict[str, dict]:
+    """读取本仓库的爬塔 pipeline（去掉 // 注释），作为用例中没有录制的节点的 node data"""
+    if not _pipeline:
+        for path in sorted(PIPELINE_DIR.rglob("*.json")):
+            with open(path, "r", encoding="utf-8") as f:
+                text = re.sub(r"^\s*//.*$", "", f.read(), flags=re.MULTILINE)
+            _pipeline.update(json.loads(text))
+    return _pipeline
+
+
+class _Status:
+    succeeded = True
+
+
+class _TaskDetail:
+    status = _Status()
+
+
+class _Job:
+    def __init__(self, value):
+        self._value = value
+
+    def wait(self):
+        return self
+
+    def get(self):
+        return self._value
+
+
+class _Controller:
+    def __init__(self, replay: "ReplayContext"):
+        self._replay = replay
+
+    def post_screencap(self):
+        return _Job(self._replay.image)
+
+    def post_click(self, x: int, y: int):
+        return _Job(None)
+
+
+class _Tasker:
+    stopping = False
+
+    def __init__(self, replay: "ReplayContext"):
+        self.controller = _Controller(replay)
+
+
+class ReplayContext:
+    """回放用的桩 Context，按录制数据返回识别结果"""
+
+    def __init__(self, case: dict, case_dir: Path, attach: dict):
+        self.screens = case["screens"]
+        self.images = [self._load_image(case_dir, s.get("image")) for s in self.screens]
+        self.nodes = {**load_pipeline(), **case.get("nodes", {})}
+        self.attach = attach
+        self.screen_index = 0
+        self.tasker = _Tasker(self)
+        self.recognition_count = 0
+        self.recognition_time = 0.0
+
+    @staticmethod
+    def _load_image(case_dir: Path, name) -> np.ndarray:
+        if not name or not HAS_PIL or not (case_dir / name).exists():
+            return BLANK_SCREEN
+        # maa 截图为 BGR 格式
+        return np.asarray(Image.open(case_dir / name).convert("RGB"))[:, :, ::-1].copy()
+
+    @property
+    def image(self) -> np.ndarray:
+        return self.images[self.screen_index]
+
+    def get_node_data(self, node_name: str) -> dict:
+        node_data = json.loads(json.dumps(self.nodes.get(node_name, {})))
+        if node_name == ACTION_NODE:
+            node_data["attach"] = self.attach
+        return node_data
+
+    def run_recognition(self, node_name: str, image, pipeline_override: dict = None):
+        start = time.perf_counter()
+        self.recognition_count += 1
+        screen = self.screens[self.screen_index]
+        recognition = self.nodes.get(node_name, {}).get("recognition", {})
+        param = {
+            **recognition.get("param", {}),
+            **(pipeline_override or {}).get(node_name, {}).get("recognition", {}).get("param", {}),
+        }
+
+        roi = param.get("roi")
+        rois = (roi if isinstance(roi[0], list) else [roi]) if roi else []
+        if recognition.get("type") == "OCR":
+            recorded = screen.get("ocr", [])
+        else:
+            recorded = screen.get("recognition", {}).get(node_name, [])
+        results = [_Result(r) for r in recorded]
+        if rois:
+            results = [r for r in results if any(self._in_roi(r.box, x) for x in rois)]
+
+        if recognition.get("type") == "OCR":
+            detail = self._ocr_detail(results, param)
+        else:
+            detail = _RecoDetail(results, results)
+        self.recognition_time += time.perf_counter() - start
+        return detail
+
+    @staticmethod
+    def _ocr_detail(results: list[_Result], param: dict) -> _RecoDetail:
+        """按 OCR 节点的 replace、threshold、expected 与 order_by 处理录制的 OCR 结果"""
+        for r in results:
+            for pattern, repl in param.get("replace", []):
+                r.text = re.sub(pattern, repl, r.text)
+
+        expected = param.get("expected", [])
+        filtered = [
+            r for r in results
+            if r.score >= param.get("threshold", 0.3)
+            and (not expected or any(re.search(pattern, r.text) for pattern in expected))
+        ]
+        if param.get("order_by") == "Vertical":
+            filtered.sort(key=lambda r: (r.box[1], r.box[0]))
+        else:
+            filtered.sort(key=lambda r: (r.box[0], r.box[1]))
+        return _RecoDetail(filtered, results)
+
+    @staticmethod
+    def _in_roi(box: list[int], roi: list[int]) -> bool:
+        cx, cy = box[0] + box[2] / 2, box[1] + box[3] / 2
+        return roi[0] <= cx <= roi[0] + roi[2] and roi[1] <= cy <= roi[1] + roi[3]
+
+    def run_task(self, node_name: str, pipeline_override: dict = None):
+        if node_name == REFRESH_TASK and self.screen_index < len(self.screens) - 1:
+            self.screen_index += 1
+        return _TaskDetail()
+
+
+class _RunArg:
+    node_name = "星塔_节点_选择潜能_agent"
+
+
+_stage_times: dict[str, float] = defaultdict(float)
+
+
+def install_stage_timers():
+    """给各个潜能处理类的阶段方法套上计时器，只需调用一次"""
+    handler_classes = [
+        climb_tower_potential.ChoosePotentialHandler,
+        climb_tower_potential.GameRecommendedHandler,
+        climb_tower_potential.AssistantPriorityHandler,
+    ]
+
+    def _timed(func, stage):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _stage_times[stage] += time.perf_counter() - start
+        return wrapper
+
+    for cls in handler_classes:
+        for method in STAGES:
+            if method in cls.__dict__:
+                setattr(cls, method, _timed(cls.__dict__[method], method))
+
+
+def load_cases(record_dir: Path) -> list[tuple[str, Path, dict]]:
+    cases = []
+    for case_file in sorted(record_dir.glob("*/case.json")):
+        with open(case_file, "r", encoding="utf-8") as f:
+            cases.append((case_file.parent.name, case_file.parent, json.load(f)))
+    return cases
+
+
+def run_benchmark(cases, handler: str, read_mode: str, priority_list: list, repeat: int) -> dict:
+    _stage_times.clear()
+
+    decisions = 0
+    recognition_count = 0
+    recognition_time = 0.0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for _, case_dir, case in cases:
+            default_attach = load_pipeline().get(ACTION_NODE, {}).get("attach", {})
+            attach = {**default_attach, "priority_list": priority_list, **case.get("attach", {})}
+            attach["handler"] = handler
+            attach["read_mode"] = read_mode
+
+            climb_tower_potential.State.reset()
+            # 刷新规划器的命中统计会影响 expected_value 的刷新决策，每次回放都从零开始
+            climb_tower_potential.RefreshPlanner.reset()
+            climb_tower_potential.State.owned_potentials.update(
+                json.loads(json.dumps(case.get("owned_potentials", {})))
+            )
+
+            context = ReplayContext(case, case_dir, attach)
+            climb_tower_potential.ChoosePotentialAction().run(context, _RunArg())
+            decisions += 1
+            recognition_count += context.recognition_count
+            recognition_time += context.recognition_time
+    wall_time = time.perf_counter() - start
+
+    stage_times = {stage: _stage_times[stage] for stage in STAGES if stage in _stage_times}
+    stage_times["recognition"] = recognition_time
+    return {
+        "handler": handler,
+        "read_mode": read_mode,
+        "decisions": decisions,
+        "wall_time": wall_time,
+        "decisions_per_second": decisions / wall_time if wall_time else 0.0,
+        "recognitions_per_decision": recognition_count / decisions if decisions else 0.0,
+        "stage_times": stage_times,
+    }
+
+
+def print_report(report: dict):
+    print(f"[{report['handler']} / {report['read_mode']}]")
+    print(f"  决策次数: {report['decisions']}，总耗时: {report['wall_time']:.3f}s")
+    print(f"  每秒决策数: {report['decisions_per_second']:.1f}")
+    print(f"  每次决策识别次数: {report['recognitions_per_decision']:.2f}")
+    for stage, seconds in report["stage_times"].items():
+        label = STAGES.get(stage, "识别")
+        per_decision = seconds / report["decisions"] * 1000 if report["decisions"] else 0.0
+        print(f"  {label:<6} {seconds:.3f}s（每次决策 {per_decision:.2f}ms）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="潜能选择离线回放基准测试")
+    parser.add_argument("record_dir", type=Path, help="录制数据目录")
+    parser.add_argument("--handler", nargs="+", default=["default", "default+", "json"])
+    parser.add_argument("--read-mode", nargs="+", default=["separate", "batch"])
+    parser.add_argument("--preset", type=Path, help="json 处理方式使用的预设作业文件")
+    parser.add_argument("--repeat", type=int, default=20, help="每个用例的重复次数")
+    args = parser.parse_args()
+
+    cases = load_cases(args.record_dir)
+    if not cases:
+        print(f"在 {args.record_dir} 中没有找到任何用例（*/case.json）")
+        sys.exit(1)
+
+    priority_list = []
+    if args.preset:
+        with open(args.preset, "r", encoding="utf-8") as f:
+            priority_list = json.load(f).get("priority_list", [])
+
+    # 回放时不需要输出每次选择的日志
+    climb_tower_potential.logger.setLevel("WARNING")
+
+    install_stage_timers()
+    print(f"共 {len(cases)} 个用例，每个用例重复 {args.repeat} 次")
+    # 爬塔状态日志写到临时目录，避免清空或污染正在进行的爬塔记录
+    with tempfile.TemporaryDirectory() as journal_dir:
+        climb_tower_potential.State.journal_path = Path(journal_dir) / "climb_tower_state.jsonl"
+        for handler in args.handler:
+            for read_mode in args.read_mode:
+                print_report(run_benchmark(cases, handler, read_mode, priority_list, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
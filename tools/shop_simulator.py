@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+
+"""
+星塔商店策略离线模拟器
+
+复用 climb_tower_shop.py 中的 Data、GridInfo 和 ShopHandler，随机生成商店货架，
+通过桩 Context 模拟购买、刷新和金币识别，用进程池并行跑大量商店访问，
+离线对比 regular_shop_refresh_threshold、full_price_buy_reserve_base、max_cost
+等参数组合的效果，不必每次都在游戏里爬很多轮塔。
+
+模拟规则：
+    - 每个格子随机生成潜能特饮、5 个音符或 15 个音符，价格为 ITEM_STANDARD_PRICES
+      中的标准价乘以随机折扣。折扣档位取 Data 中各 *_discount_threshold 默认值及其上下
+      各 0.1，使每个阈值两侧都有商品；原价的比例 FULL_PRICE_RATE 是假定值，不是游戏实测
+    - 购买总是成功；购买潜能特饮后的潜能选择不计入花费
+    - 协奏音符的核实识别总是失败，即不会购买协奏音符
+    - 离开商店后用剩余金币强化并统计强化次数，与 EnhanceAction 一致：regular 商店按 max_cost 限制，
+      final 商店不限制单次费用
+
+使用方法：
+    python tools/shop_simulator.py [--visits 10000] [--workers 8]
+        [--refresh-threshold 1000 1500 2000] [--reserve-base 300 500]
+        [--max-cost 180 260] [--shop-type regular final] [--strategy greedy solver]
+"""
+
+import sys
+import random
+import argparse
+import itertools
+from pathlib import Path
+from dataclasses import fields
+from concurrent.futures import ProcessPoolExecutor
+
+AGENT_DIR = Path(__file__).resolve().parent.parent / "agent"
+if str(AGENT_DIR) not in sys.path:
+    sys.path.insert(0, str(AGENT_DIR))
+
+from custom.action import climb_tower_shop  # noqa: E402
+from custom.action.climb_tower_shop import Data, GridInfo, ShopHandler, ShopAction  # noqa: E402
+
+
+# 与 pipeline 中 星塔_节点_商店_购物_agent 和 星塔_节点_商店_强化_agent 的 attach 保持一致
+DEFAULT_ATTACH = {
+    "lang_type": "cn",
+    "priority": ["drink", "melody"],
+    "drink_discount_threshold": 0.8,
+    "melody_5_discount_threshold": 1.0,
+    "melody_15_discount_threshold": 0.5,
+    "regular_shop_refresh_threshold": 1500,
+    "full_price_buy_reserve_base": 500,
+    "buy_assist_melody": False,
+    "melody_of_aqua": True,
+    "initial_cost": 60,
+    "max_cost": 180,
+}
+ITEM_WEIGHTS = {"potential_drink": 0.4, "melody_5": 0.35, "melody_15": 0.25}
+MELODIES = [name for name in ShopAction.ITEM_NAMES if name.startswith("melody_of_")]
+FULL_PRICE_RATE = 0.6
+DISCOUNT_THRESHOLDS = [f.default for f in fields(Data) if f.name.endswith("_discount_threshold")]
+DISCOUNTS = sorted(
+    {round(t + d, 2) for t in DISCOUNT_THRESHOLDS for d in (-0.1, 0.0, 0.1) if 0 < round(t + d, 2) < 1},
+    reverse=True
+)
+COIN_RANGE = (300, 3000)
+REFRESH_REMAINING_RANGE = (0, 3)
+REFRESH_COSTS = [50, 100, 150]
+
+COIN_NODE = "星塔_通用_识别当前金币_agent"
+BUY_NODE = "星塔_节点_商店_购物_购买道具_agent"
+
+
+class _Result:
+    def __init__(self, text: str):
+        self.text = text
+        self.box = [0, 0, 0, 0]
+        self.score = 1.0
+
+
+class _RecoDetail:
+    def __init__(self, results: list[_Result]):
+        self.filtered_results = results
+        self.all_results = results
+        self.best_result = results[0] if results else None
+        self.hit = bool(results)
+
+
+class _Status:
+    succeeded = True
+
+
+class _TaskDetail:
+    status = _Status()
+
+
+class _Job:
+    def wait(self):
+        return self
+
+    def get(self):
+        return None
+
+
+class _Controller:
+    def post_screencap(self):
+        return _Job()
+
+
+class _Tasker:
+    stopping = False
+    controller = _Controller()
+
+
+class SimContext:
+    """模拟用的桩 Context，维护真实金币数量并记录购买结果"""
+
+    def __init__(self, coin: int):
+        self.coin = coin
+        self.grids: list[GridInfo] = []
+        self.bought: list[GridInfo] = []
+        self.tasker = _Tasker()
+
+    def run_recognition(self, node_name: str, image, pipeline_override: dict = None):
+        if node_name == COIN_NODE:
+            return _RecoDetail([_Result(str(self.coin))])
+        return _RecoDetail([])
+
+    def run_task(self, node_name: str, pipeline_override: dict = None):
+        if node_name == BUY_NODE:
+            target = pipeline_override[node_name]["action"]["param"]["target"]
+            grid = next(g for g in self.grids if g.price_roi == target)
+            self.coin -= grid.item_price
+            self.bought.append(grid)
+        return _TaskDetail()
+
+
+def random_grids(rng: random.Random) -> list[GridInfo]:
+    grids = []
+    for i in range(len(ShopAction.GRID_ROIS)):
+        kind = rng.choices(list(ITEM_WEIGHTS), weights=list(ITEM_WEIGHTS.values()))[0]
+        discount = 1.0 if rng.random() < FULL_PRICE_RATE else rng.choice(DISCOUNTS)
+        price = int(ShopAction.ITEM_STANDARD_PRICES[kind] * discount)
+        if kind == "potential_drink":
+            item_name, item_quantity = kind, 1
+        else:
+            item_name, item_quantity = rng.choice(MELODIES), int(kind.split("_")[1])
+        grids.append(GridInfo(
+            grid_num=i + 1,
+            item_name=item_name,
+            item_quantity=item_quantity,
+            item_price=price,
+            display_name=item_name,
+        ))
+    return grids
+
+
+def simulate_visit(attach: dict, shop_type: str, seed: int) -> dict:
+    """模拟一次商店访问，流程与 ShopAction.run 一致"""
+    rng = random.Random(seed)
+    coin = rng.randint(*COIN_RANGE)
+    context = SimContext(coin)
+
+    data = Data.get_from_dict(attach)
+    data.shop_type = shop_type
+    data.current_coin = coin
+    data.current_cost = data.initial_cost
+    data.refresh_remaining = rng.randint(*REFRESH_REMAINING_RANGE)
+
+    refreshes = 0
+    while True:
+        data.refresh_cost = rng.choice(REFRESH_COSTS) if data.refresh_remaining > 0 else 65535
+        context.grids = random_grids(rng)
+        handler = ShopHandler(context.grids, context, data)
+
+        if data.buy_strategy == "solver":
+            handler.solver_buy_plan().buy()
+        else:
+            handler.normal_buy_plan().buy()
+        handler.high_price_drinks_buy_plan().buy()
+
+        handler.sync_coin()
+        if not handler.should_refresh():
+            break
+        context.coin -= data.refresh_cost
+        handler.spend_coin(data.refresh_cost)
+        data.refresh_remaining -= 1
+        refreshes += 1
+
+    if shop_type == "final":
+        handler.remaining_drinks_buy_plan().buy()
+        handler.remainder_buy_plan().buy()
+
+    # 离开商店后按 EnhanceAction 的规则用剩余金币强化：regular 商店受 max_cost 限制，final 商店花光金币
+    data.current_coin = context.coin
+    enhancements = data.enhancement_count if shop_type == "regular" else data.greedy_enhancement_count
+    return {
+        "drinks": sum(1 for g in context.bought if g.item_name == "potential_drink"),
+        "melodies": sum(g.item_quantity for g in context.bought if "melody" in g.item_name),
+        "target_melodies": sum(g.item_quantity for g in context.bought if g.item_name in data.target_melodies),
+        "spent": coin - context.coin,
+        "refreshes": refreshes,
+        "enhancements": enhancements,
+    }
+
+
+def simulate_batch(attach: dict, shop_type: str, seeds: range) -> dict:
+    totals: dict[str, int] = {}
+    for seed in seeds:
+        for key, value in simulate_visit(attach, shop_type, seed).items():
+            totals[key] = totals.get(key, 0) + value
+    return totals
+
+
+def run_setting(executor, attach: dict, shop_type: str, visits: int, chunk: int) -> dict:
+    futures = [
+        executor.submit(simulate_batch, attach, shop_type, range(start, min(start + chunk, visits)))
+        for start in range(0, visits, chunk)
+    ]
+    totals: dict[str, int] = {}
+    for future in futures:
+        for key, value in future.result().items():
+            totals[key] = totals.get(key, 0) + value
+    return {key: value / visits for key, value in totals.items()}
+
+
+def _quiet_logger():
+    # 模拟时不需要输出每次购买的日志
+    climb_tower_shop.logger.setLevel("WARNING")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="星塔商店策略离线模拟器")
+    parser.add_argument("--visits", type=int, default=10000, help="每组参数模拟的商店访问次数")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认为 CPU 核数")
+    parser.add_argument("--refresh-threshold", type=int, nargs="+", default=[1500])
+    parser.add_argument("--reserve-base", type=int, nargs="+", default=[500])
+    parser.add_argument("--max-cost", type=int, nargs="+", default=[180])
+    parser.add_argument("--shop-type", nargs="+", default=["regular"])
+    parser.add_argument("--strategy", nargs="+", default=["greedy"])
+    args = parser.parse_args()
+
+    chunk = max(1, args.visits // 64)
+    settings = itertools.product(
+        args.shop_type, args.strategy, args.refresh_threshold, args.reserve_base, args.max_cost
+    )
+    print(f"每组参数模拟 {args.visits} 次商店访问")
+    print(f"{'商店':<8}{'策略':<8}{'刷新阈值':>8}{'预留基数':>8}{'强化上限':>8}"
+          f"{'特饮':>7}{'音符':>7}{'目标音符':>8}{'花费':>8}{'刷新':>6}{'强化':>6}")
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_quiet_logger) as executor:
+        for shop_type, strategy, threshold, reserve_base, max_cost in settings:
+            attach = {
+                **DEFAULT_ATTACH,
+                "buy_strategy": strategy,
+                "regular_shop_refresh_threshold": threshold,
+                "full_price_buy_reserve_base": reserve_base,
+                "max_cost": max_cost,
+            }
+            r = run_setting(executor, attach, shop_type, args.visits, chunk)
+            print(f"{shop_type:<8}{strategy:<8}{threshold:>8}{reserve_base:>8}{max_cost:>8}"
+                  f"{r['drinks']:>7.2f}{r['melodies']:>7.2f}{r['target_melodies']:>8.2f}"
+                  f"{r['spent']:>8.0f}{r['refreshes']:>6.2f}{r['enhancements']:>6.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+"""
+预设作业批量校验工具
+
+用进程池并行校验 agent/presets 下的所有预设作业，校验规则与爬塔准备阶段
+（utils.preset.iter_priority_list_errors）一致，但会输出每个文件的全部错误，
+而不是只输出第一个。同时对比同一队伍各语言版本的规则结构（规则数量、字段、
+数值参数、潜能数量和条件结构），找出只改了某个语言版本的情况。
+
+使用方法：
+    python tools/validate_presets.py [preset_dir] [--workers 8]
+
+存在任何错误时以退出码 1 结束。
+"""
+
+import sys
+import json
+import argparse
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+AGENT_DIR = Path(__file__).resolve().parent.parent / "agent"
+if str(AGENT_DIR) not in sys.path:
+    sys.path.insert(0, str(AGENT_DIR))
+
+from utils.preset import PRESET_DIR, PresetCatalog, iter_priority_list_errors  # noqa: E402
+
+
+def rule_shape(obj):
+    """把规则中的字符串替换为占位符，得到与语言无关的规则结构"""
+    if isinstance(obj, dict):
+        return {k: rule_shape(v) for k, v in sorted(obj.items())}
+    if isinstance(obj, list):
+        return [rule_shape(v) for v in obj]
+    if isinstance(obj, str):
+        return "<str>"
+    return obj
+
+
+def validate_file(path: Path) -> tuple[list[str], list | None]:
+    """校验单个预设作业，返回 (全部错误信息, 规则结构)，无法解析时规则结构为 None"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            preset = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        return [f"无法解析作业文件：{e}"], None
+    if not isinstance(preset, dict):
+        return ["作业文件顶层必须是 dict"], None
+
+    priority_list = preset.get("priority_list", [])
+    errors = list(iter_priority_list_errors(priority_list))
+    shape = [rule_shape(rule) for rule in priority_list] if isinstance(priority_list, list) else None
+    return errors, shape
+
+
+def compare_shapes(shapes: dict[str, list]) -> list[str]:
+    """对比同一队伍各语言版本的规则结构，返回差异描述"""
+    differences = []
+    (base_language, base), *others = shapes.items()
+    for language, shape in others:
+        if len(shape) != len(base):
+            differences.append(f"{language} 有 {len(shape)} 条规则，{base_language} 有 {len(base)} 条")
+            continue
+        for i, (a, b) in enumerate(zip(base, shape), start=1):
+            if a != b:
+                differences.append(f"priority_list[{i}] 的结构在 {language} 与 {base_language} 中不一致")
+    return differences
+
+
+def main():
+    parser = argparse.ArgumentParser(description="预设作业批量校验工具")
+    parser.add_argument("preset_dir", type=Path, nargs="?", default=PRESET_DIR, help="预设作业目录")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认为 CPU 核数")
+    args = parser.parse_args()
+
+    catalog = PresetCatalog(args.preset_dir)
+    entries = list(catalog.entries.values())
+    if not entries:
+        print(f"在 {args.preset_dir} 中没有找到任何预设作业")
+        sys.exit(1)
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {entry.name: executor.submit(validate_file, entry.path) for entry in entries}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                # 单个文件校验出错时记为该文件的错误，继续报告其他文件
+                results[name] = [f"校验过程出现异常：{e!r}"], None
+
+    error_count = 0
+    for name, (errors, _) in results.items():
+        for error in errors:
+            print(f"[{name}] {error}")
+        error_count += len(errors)
+
+    for team in catalog.teams():
+        shapes = {
+            language: results[entry.name][1]
+            for language, entry in sorted(catalog.by_team(team).items())
+            if results[entry.name][1] is not None
+        }
+        if len(shapes) < 2:
+            continue
+        for difference in compare_shapes(shapes):
+            print(f"[{team}] {difference}")
+            error_count += 1
+
+    print(f"共校验 {len(entries)} 个预设作业，{len(catalog.teams())} 个队伍，发现 {error_count} 个问题")
+    sys.exit(1 if error_count else 0)
+
+
+if __name__ == "__main__":
+    main()